@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from evaluation import aevaluate_with_gpt4, clip_scorer
+from video_metrics import ClipFrameSampler, CoherenceConsumer, MotionConsumer, analyze_video
+
+
+def load_items(source):
+    """
+    Read evaluation items from a JSONL manifest or a directory of clips.
+
+    Manifest lines look like {"video_path", "prompt", "storyboard", "video_description"}
+    ("id" is optional). For a directory every *.mp4 is an item, with fields read from
+    a sidecar <name>.json when present (e.g. the result cache's metadata files).
+    """
+    items = []
+    if os.path.isdir(source):
+        for video_path in sorted(glob.glob(os.path.join(source, "*.mp4"))):
+            item = {"video_path": video_path}
+            sidecar = os.path.splitext(video_path)[0] + ".json"
+            if os.path.exists(sidecar):
+                with open(sidecar) as f:
+                    item.update({k: v for k, v in json.load(f).items() if k != "video_path"})
+            items.append(item)
+    else:
+        with open(source) as f:
+            items = [json.loads(line) for line in f if line.strip()]
+
+    for item in items:
+        item.setdefault("id", item["video_path"])
+    return items
+
+
+def is_failed(record):
+    # Failed items (including a failed GPT-4o judge) are retried by the next run
+    gpt_eval = record.get("gpt_eval")
+    return "error" in record or (isinstance(gpt_eval, dict) and "error" in gpt_eval)
+
+
+def load_done_ids(output_path):
+    """
+    Ids successfully written to the results file, so a restarted run can skip them.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if not is_failed(record):
+                    done.add(record["id"])
+            except (json.JSONDecodeError, KeyError):
+                # A torn final line from an interrupted run; that item is redone
+                continue
+    return done
+
+
+def compute_frame_metrics(video_path, stride=1, max_side=None, motion_estimator="farneback", num_clip_frames=4):
+    """
+    CPU-bound part of the evaluation, run in a worker process: one decode for motion,
+    SSIM and CLIP frame sampling. Sampled frames are shrunk before being sent back.
+    """
+    results = analyze_video(
+        video_path,
+        [MotionConsumer(motion_estimator), CoherenceConsumer(), ClipFrameSampler(num_clip_frames)],
+        stride, max_side
+    )
+    frames = results.pop(ClipFrameSampler.name)
+    for frame in frames:
+        frame.thumbnail((336, 336))
+    results = {name: float(value) for name, value in results.items()}
+    return results, frames
+
+
+def _call_frame_metrics(video_path, metric_kwargs):
+    return compute_frame_metrics(video_path, **metric_kwargs)
+
+
+async def _evaluate_item(item, loop, process_pool, clip_pool, llm_semaphore, use_llm, metric_kwargs):
+    record = {"id": item["id"], "video_path": item["video_path"]}
+    try:
+        metrics_task = loop.run_in_executor(process_pool, _call_frame_metrics, item["video_path"], metric_kwargs)
+
+        gpt_eval = None
+        if use_llm and item.get("storyboard") and item.get("video_description"):
+            async with llm_semaphore:
+                try:
+                    gpt_eval = await aevaluate_with_gpt4(item["storyboard"], item["video_description"])
+                except Exception as e:
+                    gpt_eval = {"error": str(e)}
+
+        metrics, frames = await metrics_task
+        if item.get("prompt") and frames:
+            # CLIP runs on a single thread in this process so the model is loaded once
+            matrix = await loop.run_in_executor(clip_pool, clip_scorer.score, frames, [item["prompt"]])
+            metrics["clip_similarity"] = float(matrix.mean())
+        record.update({"gpt_eval": gpt_eval, "metrics": metrics})
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+async def evaluate_batch(items, output_path, workers=None, llm_concurrency=8, use_llm=True,
+                         stride=1, max_side=None, motion_estimator="farneback", num_clip_frames=4,
+                         max_in_flight=None):
+    """
+    Evaluate items concurrently and append one JSON line per finished item to output_path.
+
+    Frame metrics run on a process pool, GPT-4o judging runs on the event loop with at
+    most llm_concurrency requests in flight. At most max_in_flight items (default:
+    enough to keep both busy) are started at once, so sampled frames and results never
+    pile up for the whole dataset. Items already evaluated successfully in output_path
+    are skipped; failed ones are retried. Returns the number of items evaluated in this run.
+    """
+    done = load_done_ids(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(done)} already evaluated, {len(pending)} to go")
+    if not pending:
+        return 0
+
+    metric_kwargs = {"stride": stride, "max_side": max_side, "motion_estimator": motion_estimator,
+                     "num_clip_frames": num_clip_frames}
+    if max_in_flight is None:
+        max_in_flight = 2 * (workers or os.cpu_count() or 1) + llm_concurrency
+    loop = asyncio.get_running_loop()
+    llm_semaphore = asyncio.Semaphore(llm_concurrency)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as process_pool, \
+            ThreadPoolExecutor(max_workers=1) as clip_pool, \
+            open(output_path, "a") as out:
+        remaining = iter(pending)
+        in_flight, finished = set(), 0
+        while True:
+            # Top the window up as items finish instead of creating every task up front
+            for item in remaining:
+                in_flight.add(asyncio.ensure_future(
+                    _evaluate_item(item, loop, process_pool, clip_pool, llm_semaphore, use_llm, metric_kwargs)
+                ))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            completed, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in completed:
+                out.write(json.dumps(task.result(), ensure_ascii=False) + "\n")
+                finished += 1
+                if finished % 50 == 0 or finished == len(pending):
+                    print(f"Evaluated {finished}/{len(pending)}")
+            out.flush()
+    return len(pending)
+
+
+def export_parquet(jsonl_path, parquet_path):
+    import pandas as pd
+
+    # Retried items appear more than once; the latest record wins
+    records = {}
+    with open(jsonl_path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[record["id"]] = record
+    pd.json_normalize(list(records.values())).to_parquet(parquet_path, index=False)
+    return parquet_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-evaluate generated clips")
+    parser.add_argument("source", help="Directory of .mp4 clips or a JSONL manifest")
+    parser.add_argument("--output", default="output/evaluation.jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="Frame-metric processes (default: CPU count)")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Items evaluated at once")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the GPT-4o judge")
+    parser.add_argument("--stride", type=int, default=1)
+    parser.add_argument("--max-side", type=int, default=None)
+    parser.add_argument("--motion-estimator", default="farneback")
+    parser.add_argument("--parquet", default=None, help="Also write the results to this Parquet file")
+    args = parser.parse_args()
+
+    asyncio.run(evaluate_batch(
+        load_items(args.source), args.output, workers=args.workers, llm_concurrency=args.llm_concurrency,
+        use_llm=not args.no_llm, stride=args.stride, max_side=args.max_side,
+        motion_estimator=args.motion_estimator, max_in_flight=args.max_in_flight
+    ))
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
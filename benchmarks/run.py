@@ -0,0 +1,227 @@
+"""
+End-to-end benchmarks against local stand-ins (see benchmarks/stubs.py).
+
+    python -m benchmarks.run --concurrency 1,4,8 --requests 16 --output bench.json
+
+Every scenario is run at each concurrency level with `requests` calls spread over
+that many threads. One JSON document is written with per-scenario latency
+percentiles and throughput, plus the commit and machine it was measured on.
+Scenarios whose dependencies are missing are reported with an error instead of
+aborting the run.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stubs import FakeOpenAIServer, make_sample_clip  # noqa: E402
+
+SCENARIOS = ("generate_video", "build_scene_sequence", "generate_multiple_storyboards", "evaluate_video")
+VIDEO_BACKENDS = ("Wan2.1", "Veo-2", "T2V-01-Director")
+STORYBOARD = {"scene": "misty forest", "shot_type": "wide shot", "emotion": "mysterious"}
+
+
+def run_load(fn, num_requests, concurrency):
+    """
+    Call fn(i) for i in range(num_requests) on `concurrency` threads and summarise latencies.
+    """
+    def timed_call(i):
+        start = time.perf_counter()
+        try:
+            fn(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        outcomes = list(pool.map(timed_call, range(num_requests)))
+    wall = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, error in outcomes if error is None])
+    errors = [error for _, error in outcomes if error is not None]
+    row = {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "wall_sec": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 4) if wall else None,
+    }
+    if len(latencies):
+        row["latency_sec"] = {
+            "mean": round(float(latencies.mean()), 4),
+            "p50": round(float(np.percentile(latencies, 50)), 4),
+            "p95": round(float(np.percentile(latencies, 95)), 4),
+            "max": round(float(latencies.max()), 4),
+        }
+    if errors:
+        row["first_error"] = errors[0]
+    return row
+
+
+def _unique(text):
+    # Distinct prompts so neither the video cache nor the LLM cache can serve a repeat
+    return f"{text} [{uuid.uuid4().hex[:8]}]"
+
+
+def build_calls(args, sample_clip):
+    """
+    Return [(scenario, backend, fn)] for the selected scenarios; fn takes the request index.
+    """
+    calls = []
+    scenarios = args.scenarios.split(",")
+    backends = args.backends.split(",")
+
+    if "generate_video" in scenarios:
+        from generation import generate_video
+
+        for backend in backends:
+            calls.append(("generate_video", backend,
+                          lambda i, backend=backend: generate_video(_unique("a cat reading a book"), backend)))
+
+    if "build_scene_sequence" in scenarios:
+        from cinematic_planning import build_scene_sequence
+
+        def scene(i, backend):
+            storyboard = dict(STORYBOARD, scene=_unique(STORYBOARD["scene"]))
+            steps = build_scene_sequence(storyboard, backend, num_keyframes=args.keyframes, concurrent=True)
+            failed = [step["error"] for step in steps if step.get("error")]
+            if failed:
+                raise RuntimeError(f"{len(failed)} keyframes failed: {failed[0]}")
+
+        for backend in backends:
+            calls.append(("build_scene_sequence", backend, lambda i, backend=backend: scene(i, backend)))
+
+    if "generate_multiple_storyboards" in scenarios:
+        from storyboard import generate_multiple_storyboards
+
+        calls.append(("generate_multiple_storyboards", None,
+                      lambda i: generate_multiple_storyboards(_unique("A girl walks into a dark forest"))))
+
+    if "evaluate_video" in scenarios:
+        from evaluation import evaluate_video
+
+        calls.append(("evaluate_video", None,
+                      lambda i: evaluate_video(STORYBOARD, _unique("A slow pan across a forest"), sample_clip,
+                                               None, "a misty forest at night")))
+    return calls
+
+
+def install_stubs(args, sample_clip):
+    """
+    Install the fake remote clients, the tiny Wan pipeline and tiny CLIP. Returns
+    {component: error} for anything that could not be installed.
+    """
+    from benchmarks import stubs
+
+    failures = {}
+    with open(sample_clip, "rb") as f:
+        video_bytes = f.read()
+    installers = {
+        "remote_backends": lambda: stubs.install_remote_fakes(video_bytes, args.veo_latency, args.hailuo_latency),
+        "wan": stubs.install_tiny_wan,
+        "clip": stubs.install_tiny_clip,
+    }
+    for name, install in installers.items():
+        try:
+            install()
+        except Exception as e:
+            failures[name] = f"{type(e).__name__}: {e}"
+            print(f"Could not install {name} stub: {failures[name]}")
+    return failures
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the video pipeline against local stub backends")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--backends", default=",".join(VIDEO_BACKENDS))
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=8, help="Calls per scenario and concurrency level")
+    parser.add_argument("--keyframes", type=int, default=4, help="Keyframes per build_scene_sequence call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated OpenAI latency (s)")
+    parser.add_argument("--veo-latency", type=float, default=0.2, help="Simulated Veo render time (s)")
+    parser.add_argument("--hailuo-latency", type=float, default=0.2, help="Simulated Hailuo render time (s)")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="First remote poll delay (s)")
+    parser.add_argument("--workdir", default=None, help="Where outputs and caches go (default: a temp dir)")
+    parser.add_argument("--output", default=None, help="Write the JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    output_path = os.path.abspath(args.output) if args.output else None
+    os.chdir(workdir)
+
+    server = FakeOpenAIServer(args.llm_latency).start()
+    # Read by the app modules at import time, so set before anything below imports them
+    os.environ.update({
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": "bench",
+        "MINIMAX_API_KEY": "bench",
+        "LLM_CACHE_MODE": "off",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_responses.sqlite3"),
+        "VIDEO_CACHE": "0",
+        "VIDEO_CACHE_DIR": os.path.join(workdir, "videos"),
+        "REMOTE_POLL_INITIAL_SEC": str(args.poll_interval),
+    })
+
+    sample_clip = make_sample_clip(os.path.join(workdir, "sample.mp4"))
+    stub_failures = install_stubs(args, sample_clip)
+
+    results = []
+    for scenario, backend, fn in build_calls(args, sample_clip):
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            print(f"Running {scenario} {backend or ''} at concurrency {concurrency}...", file=sys.stderr)
+            row = {"scenario": scenario, "backend": backend}
+            row.update(run_load(fn, args.requests, concurrency))
+            results.append(row)
+    server.stop()
+
+    from telemetry import telemetry
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "stub_failures": stub_failures,
+            "openai_requests": server.requests,
+        },
+        "results": results,
+        # Time per pipeline stage across the whole run (see telemetry.py)
+        "stages": telemetry.summary(),
+    }
+    text = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
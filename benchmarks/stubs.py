@@ -0,0 +1,378 @@
+"""
+Local stand-ins for every external service the app talks to, so the pipeline can be
+timed offline: an OpenAI-compatible HTTP server, fake Vertex genai + GCS clients, a
+fake MiniMax Hailuo transport adapter and a tiny randomly initialised Wan pipeline.
+
+Each fake takes a latency so remote work can be simulated without being measured.
+"""
+import base64
+import hashlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+
+
+def make_sample_clip(path=None, width=320, height=192, num_frames=24, fps=16):
+    """
+    Write a small moving-gradient mp4 and return its path. Used as the payload of the
+    fake remote backends and as input for evaluate_video.
+    """
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-clip-"), "sample.mp4")
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x[None, :] + y) / 2
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(num_frames):
+        shifted = np.roll(base, i * 4, axis=1)
+        frame = np.dstack([shifted, 255 - shifted, np.full_like(shifted, 128)])
+        writer.write(frame.astype(np.uint8))
+    writer.release()
+    return path
+
+
+# --- OpenAI ------------------------------------------------------------------------
+
+def _fake_completion_content(messages, index):
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    if "storyboard artist" in system:
+        shots = ["Wide shot", "Close-up", "Tracking shot", "Low angle", "Over-the-shoulder"]
+        return json.dumps({
+            "scene": f"A misty forest at night, variation {index + 1}",
+            "shot_type": shots[index % len(shots)],
+            "emotion": "Eerie and mysterious",
+        })
+    if "film critic" in system:
+        return json.dumps({"story_consistency": 7, "shot_variety": 6, "relevance": 8,
+                           "justification": "Benchmark stub response."})
+    return "A cinematic shot of a lone figure walking through a misty forest at night."
+
+
+class FakeOpenAIServer:
+    """
+    Minimal OpenAI-compatible /v1/chat/completions server on a background thread.
+
+    Point the SDK at it with OPENAI_BASE_URL=server.base_url. Every request sleeps
+    latency_sec before answering; storyboard and critic prompts get JSON bodies that
+    the app's parsers accept, and `n` choices are honoured. With stream=True the
+    choices are sent as server-sent events, finishing one after another.
+    """
+
+    def __init__(self, latency_sec=0.0, host="127.0.0.1", port=0):
+        self.latency_sec = latency_sec
+        self.requests = 0
+        self._counter_lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                with server._counter_lock:
+                    server.requests += 1
+                if body.get("stream"):
+                    self._stream(body)
+                    return
+                time.sleep(server.latency_sec)
+                choices = [
+                    {"index": i, "finish_reason": "stop", "logprobs": None,
+                     "message": {"role": "assistant", "content": _fake_completion_content(body["messages"], i)}}
+                    for i in range(body.get("n") or 1)
+                ]
+                self._send(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4o"),
+                    "choices": choices,
+                    "usage": {"prompt_tokens": 50, "completion_tokens": 50, "total_tokens": 100},
+                })
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                num_choices = body.get("n") or 1
+                for i in range(num_choices):
+                    time.sleep(server.latency_sec / num_choices)
+                    content = _fake_completion_content(body["messages"], i)
+                    for delta, finish_reason in (({"role": "assistant", "content": content}, None), ({}, "stop")):
+                        chunk = {
+                            "id": "chatcmpl-stream", "object": "chat.completion.chunk",
+                            "created": int(time.time()), "model": body.get("model", "gpt-4o"),
+                            "choices": [{"index": i, "delta": delta, "finish_reason": finish_reason}],
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# --- Vertex genai + GCS --------------------------------------------------------------
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.md5_hash = None
+        self.crc32c = None
+
+    def upload_from_string(self, data):
+        self.bucket.objects[self.name] = data
+
+    def reload(self):
+        data = self.bucket.objects[self.name]
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+    def open(self, mode="rb", chunk_size=None):
+        return io.BytesIO(self.bucket.objects[self.name])
+
+    def delete(self):
+        self.bucket.objects.pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(self, name):
+        self.name = name
+        self.objects = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    """
+    In-memory stand-in for google.cloud.storage.Client covering what gcs_io uses.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, name):
+        with self._lock:
+            if name not in self._buckets:
+                self._buckets[name] = FakeBucket(name)
+            return self._buckets[name]
+
+
+class FakeGenaiClient:
+    """
+    Stand-in for google.genai.Client(vertexai=True): generate_videos returns an
+    operation that completes latency_sec later, at which point video_bytes are
+    written to the requested output_gcs_uri in the fake storage client.
+    """
+
+    def __init__(self, storage_client, video_bytes, latency_sec=0.0):
+        self.storage_client = storage_client
+        self.video_bytes = video_bytes
+        self.latency_sec = latency_sec
+        self._operations = {}
+        self._lock = threading.Lock()
+        self.models = SimpleNamespace(generate_videos=self._generate_videos)
+        self.operations = SimpleNamespace(get=self._get_operation)
+
+    def _generate_videos(self, model, prompt, config):
+        name = f"operations/{uuid.uuid4().hex}"
+        with self._lock:
+            self._operations[name] = (time.time() + self.latency_sec, config.output_gcs_uri)
+        return self._get_operation(SimpleNamespace(name=name))
+
+    def _get_operation(self, operation):
+        with self._lock:
+            ready_at, uri = self._operations[operation.name]
+        if time.time() < ready_at:
+            return SimpleNamespace(name=operation.name, done=False, error=None, response=None, result=None)
+
+        bucket_name, _, blob_name = uri[len("gs://"):].partition("/")
+        blob = self.storage_client.bucket(bucket_name).blob(blob_name)
+        if blob_name not in blob.bucket.objects:
+            blob.upload_from_string(self.video_bytes)
+        result = SimpleNamespace(generated_videos=[SimpleNamespace(video=SimpleNamespace(uri=uri))])
+        return SimpleNamespace(name=operation.name, done=True, error=None, response=result, result=result)
+
+
+# --- MiniMax Hailuo ------------------------------------------------------------------
+
+class FakeHailuoAdapter(BaseAdapter):
+    """
+    requests transport adapter that answers the Hailuo video API in-process. Tasks
+    report Processing until latency_sec has passed, then Success with a file whose
+    download URL serves video_bytes.
+    """
+
+    def __init__(self, video_bytes, latency_sec=0.0):
+        super().__init__()
+        self.video_bytes = video_bytes
+        self.latency_sec = latency_sec
+        self._tasks = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _response(self, request, status, body, content_type="application/json"):
+        response = requests.Response()
+        response.status_code = status
+        response.headers["Content-Type"] = content_type
+        response._content = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        response._content_consumed = True
+        response.raw = io.BytesIO(response._content)
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = urlparse(request.url)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+
+        if request.method == "POST" and path.endswith("/video_generation"):
+            with self._lock:
+                task_id = f"task-{next(self._ids)}"
+                self._tasks[task_id] = time.time() + self.latency_sec
+            return self._response(request, 200, {"task_id": task_id, "base_resp": {"status_code": 0}})
+        if path.endswith("/query/video_generation"):
+            with self._lock:
+                ready_at = self._tasks.get(query.get("task_id"))
+            if ready_at is None:
+                return self._response(request, 200, {"status": "Fail"})
+            if time.time() < ready_at:
+                return self._response(request, 200, {"status": "Processing"})
+            return self._response(request, 200, {"status": "Success", "file_id": query["task_id"]})
+        if path.endswith("/files/retrieve"):
+            download_url = f"{url.scheme}://{url.netloc}/download/{query['file_id']}.mp4"
+            return self._response(request, 200, {"file": {"download_url": download_url}})
+        if path.startswith("/download/"):
+            return self._response(request, 200, self.video_bytes, "video/mp4")
+        return self._response(request, 404, {"error": f"Unknown path {url.path}"})
+
+    def close(self):
+        pass
+
+
+# --- Wan2.1 and CLIP -----------------------------------------------------------------
+
+# Render size used for every preset when the tiny pipeline is installed
+TINY_WAN_RENDER = {"height": 64, "width": 64, "num_frames": 9, "num_inference_steps": 4}
+
+
+def make_tiny_wan_pipeline(text_encoder_id="hf-internal-testing/tiny-random-t5"):
+    """
+    A randomly initialised WanPipeline with the same architecture as Wan2.1 but a
+    few thousand parameters (the configuration diffusers uses in its own tests).
+    """
+    import torch
+    from diffusers import AutoencoderKLWan, UniPCMultistepScheduler, WanPipeline, WanTransformer3DModel
+    from transformers import AutoTokenizer, T5EncoderModel
+
+    torch.manual_seed(0)
+    vae = AutoencoderKLWan(base_dim=3, z_dim=16, dim_mult=[1, 1, 1, 1], num_res_blocks=1,
+                           temperal_downsample=[False, True, True])
+    transformer = WanTransformer3DModel(
+        patch_size=(1, 2, 2), num_attention_heads=2, attention_head_dim=12, in_channels=16, out_channels=16,
+        text_dim=32, freq_dim=256, ffn_dim=32, num_layers=2, cross_attn_norm=True,
+        qk_norm="rms_norm_across_heads", rope_max_seq_len=32
+    )
+    scheduler = UniPCMultistepScheduler(prediction_type="flow_prediction", use_flow_sigmas=True,
+                                        num_train_timesteps=1000, flow_shift=3.0)
+    pipe = WanPipeline(
+        transformer=transformer.eval(),
+        vae=vae.eval(),
+        scheduler=scheduler,
+        text_encoder=T5EncoderModel.from_pretrained(text_encoder_id).eval(),
+        tokenizer=AutoTokenizer.from_pretrained(text_encoder_id),
+    )
+    return pipe
+
+
+def install_tiny_wan(model_ids=None):
+    """
+    Register the tiny pipeline for the Wan model ids and shrink every Wan preset to
+    TINY_WAN_RENDER, so generate_video / build_scene_sequence exercise the real code
+    path (registry, micro-batching, exporter) in seconds.
+    """
+    import generation
+    from pipeline_registry import DEFAULT_WAN_MODEL_ID, registry
+
+    pipe = make_tiny_wan_pipeline()
+    for model_id in model_ids or [DEFAULT_WAN_MODEL_ID]:
+        registry.register(model_id, pipe)
+    for settings in generation.WAN_PRESETS.values():
+        settings.update(TINY_WAN_RENDER)
+    return pipe
+
+
+def install_tiny_clip(model_id="hf-internal-testing/tiny-random-clip"):
+    """
+    Swap the shared ClipScorer onto a tiny random CLIP model.
+    """
+    from transformers import CLIPModel, CLIPProcessor
+
+    from evaluation import clip_scorer
+
+    clip_scorer.model = CLIPModel.from_pretrained(model_id).eval()
+    clip_scorer.processor = CLIPProcessor.from_pretrained(model_id)
+    return clip_scorer
+
+
+def install_remote_fakes(video_bytes, veo_latency_sec=0.0, hailuo_latency_sec=0.0):
+    """
+    Install the fake Veo (genai + storage) and Hailuo clients as the app's shared clients.
+    """
+    import generation
+    from hailuo_client import HailuoClient, set_hailuo_client
+
+    storage_client = FakeStorageClient()
+    genai_client = FakeGenaiClient(storage_client, video_bytes, veo_latency_sec)
+    generation.set_gcp_clients(genai_client, storage_client)
+
+    hailuo_adapter = FakeHailuoAdapter(video_bytes, hailuo_latency_sec)
+    set_hailuo_client(HailuoClient(api_key="bench", base_url="http://hailuo.bench/v1", adapter=hailuo_adapter))
+    return {"storage": storage_client, "genai": genai_client, "hailuo": hailuo_adapter}
@@ -0,0 +1,165 @@
+"""
+Compare Wan inference profiles (pipeline_registry.WAN_INFERENCE_PROFILES) for speed
+and output quality against the first profile listed (baseline by default).
+
+    python -m benchmarks.wan_profiles --profiles baseline,fast,turbo --preset draft
+    python -m benchmarks.wan_profiles --tiny        # tiny random pipeline, seconds
+
+Every profile renders the same prompt with the same seed, each in its own Python process
+so torch's process-wide thread settings (the inter-op pool can only be sized once) do not
+carry over from one profile to the next. The first render is reported separately (it
+includes torch.compile), the remaining runs are averaged. Each row lists the intra- and
+inter-op thread counts the run actually used. Quality is PSNR and SSIM of each profile's
+frames against the first profile's frames.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coherence import ssim  # noqa: E402
+
+
+def _to_uint8_frames(frames):
+    return [np.clip(np.asarray(frame) * 255, 0, 255).round().astype(np.uint8) for frame in frames]
+
+
+def compare_frames(frames, reference):
+    """
+    Mean PSNR (dB) and grayscale SSIM of frames against reference frames.
+    """
+    psnrs, ssims = [], []
+    for frame, ref in zip(frames, reference):
+        psnrs.append(cv2.PSNR(frame, ref))
+        ssims.append(ssim(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), cv2.cvtColor(ref, cv2.COLOR_RGB2GRAY)))
+    return round(float(np.mean(psnrs)), 3), round(float(np.mean(ssims)), 5)
+
+
+def benchmark_profile(pipe, profile, settings, prompt, seed, runs):
+    import torch
+
+    from generation import WAN_DEFAULT_NEGATIVE_PROMPT
+    from pipeline_registry import apply_inference_profile
+
+    applied = apply_inference_profile(pipe, profile)
+    settings = dict(settings)
+    settings.pop("flow_shift", None)
+    timings, frames = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        with torch.inference_mode():
+            output = pipe(prompt=prompt, negative_prompt=WAN_DEFAULT_NEGATIVE_PROMPT,
+                          generator=torch.Generator().manual_seed(seed), **settings).frames[0]
+        timings.append(time.perf_counter() - start)
+        frames = _to_uint8_frames(output)
+    return applied, timings, frames
+
+
+def run_profile(profile, args):
+    """
+    Load a pipeline, benchmark one profile on it and return (row, frames).
+    Called in the child process started by main for that profile.
+    """
+    import torch
+
+    from generation import WAN_PRESETS
+    from pipeline_registry import DEFAULT_WAN_MODEL_ID, PipelineRegistry
+
+    settings = dict(WAN_PRESETS[args.preset])
+    if args.tiny:
+        from benchmarks.stubs import TINY_WAN_RENDER, make_tiny_wan_pipeline
+        settings.update(TINY_WAN_RENDER)
+        pipe = make_tiny_wan_pipeline()
+    else:
+        entry = PipelineRegistry(profile="baseline").get(args.model_id or DEFAULT_WAN_MODEL_ID)
+        entry.set_flow_shift(settings["flow_shift"])
+        pipe = entry.pipe
+    applied, timings, frames = benchmark_profile(pipe, profile, settings, args.prompt, args.seed, args.runs)
+    row = {
+        "profile": profile,
+        "applied": applied,
+        "threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "cold_sec": round(timings[0], 3),
+        "warm_sec": round(float(np.mean(timings[1:])), 3) if len(timings) > 1 else None,
+    }
+    return row, frames
+
+
+def _child_args(args, profile, out_prefix):
+    argv = [sys.executable, os.path.abspath(__file__), "--profiles", profile, "--preset", args.preset,
+            "--prompt", args.prompt, "--seed", str(args.seed), "--runs", str(args.runs), "--child-output", out_prefix]
+    if args.model_id:
+        argv += ["--model-id", args.model_id]
+    if args.tiny:
+        argv.append("--tiny")
+    return argv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Wan inference profiles")
+    parser.add_argument("--profiles", default="baseline,fast,compiled,turbo")
+    parser.add_argument("--preset", default="draft", help="generation.WAN_PRESETS entry")
+    parser.add_argument("--model-id", default=None)
+    parser.add_argument("--prompt", default="A cat walks on the grass, realistic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=2, help="Renders per profile (first one is cold)")
+    parser.add_argument("--tiny", action="store_true", help="Use the tiny random pipeline from benchmarks.stubs")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child-output", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child_output:
+        # Child process: one profile, results handed back through <prefix>.json/.npy
+        row, frames = run_profile(args.profiles, args)
+        np.save(args.child_output + ".npy", np.stack(frames))
+        with open(args.child_output + ".json", "w") as f:
+            json.dump(row, f)
+        return row
+
+    from generation import WAN_PRESETS
+
+    settings = dict(WAN_PRESETS[args.preset])
+    if args.tiny:
+        from benchmarks.stubs import TINY_WAN_RENDER
+        settings.update(TINY_WAN_RENDER)
+
+    rows, reference = [], None
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles.split(","):
+            # A fresh process per profile: no thread settings, compile or cache hooks leak between runs
+            out_prefix = os.path.join(tmp, profile)
+            subprocess.run(_child_args(args, profile, out_prefix), check=True)
+            with open(out_prefix + ".json") as f:
+                row = json.load(f)
+            frames = list(np.load(out_prefix + ".npy"))
+
+            if reference is None:
+                reference = (frames, row["warm_sec"] or row["cold_sec"])
+            else:
+                psnr, frame_ssim = compare_frames(frames, reference[0])
+                row.update({"psnr_vs_reference": psnr, "ssim_vs_reference": frame_ssim,
+                            "speedup": round(reference[1] / (row["warm_sec"] or row["cold_sec"]), 2)})
+            rows.append(row)
+            print(json.dumps(row), file=sys.stderr)
+
+    report = {"preset": args.preset, "settings": settings, "tiny": args.tiny, "results": rows}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from generation import generate_video
+from generation import BACKEND_CONCURRENCY, backend_slot, generate_video, iter_wan_batch
+from lazy import lazy_import, lazy_object
+from telemetry import telemetry
+from worker_pool import PRIORITY_BATCH
+
+openai = lazy_import("openai")
 
 # Load env for OpenAI
 load_dotenv()
-client = OpenAI()
+client = lazy_object("openai client (cinematic_planning)", lambda: openai.OpenAI())
 
 
 def storyboard_to_pseudo_video(storyboard):
@@ -27,10 +33,84 @@ def storyboard_to_pseudo_video(storyboard):
     }
 
 
+# How the scene develops over a sequence: the character's path cycles, the camera moves
+# from the storyboard's framing through closer coverage, and the emotion builds then settles
+CHARACTER_PATHS = ["left_to_right", "toward_camera", "right_to_left", "away_from_camera"]
+# Framings from widest to tightest; the camera tightens from the storyboard's shot_type
+CAMERA_FRAMINGS = ["extreme wide shot", "wide shot", "full shot", "medium shot", "medium close-up", "close-up",
+                   "extreme close-up"]
+# Checked in order against the storyboard's free-text shot_type (longer phrases first)
+FRAMING_KEYWORDS = [("extreme close", 6), ("medium close", 4), ("close", 5), ("extreme wide", 0),
+                    ("extreme long", 0), ("establishing", 0), ("wide", 1), ("long shot", 1), ("full", 2),
+                    ("medium", 3), ("mid", 3)]
+EMOTION_ARC = ["{emotion}", "more {emotion}", "deeply {emotion}", "calmer, still {emotion}"]
+ACTIONS = ["walk", "pause and look around", "walk faster", "stop and turn"]
+PATH_PHRASES = {
+    "toward_camera": "toward the camera",
+    "away_from_camera": "away from the camera",
+}
+
+
+def describe_path(path):
+    return PATH_PHRASES.get(path) or f"across the screen from {path.replace('_', ' ')}"
+
+
+def framing_index(shot_type):
+    """
+    Position of a free-text shot type in CAMERA_FRAMINGS; unrecognised shots count as medium.
+    """
+    shot_type = (shot_type or "").lower().replace("closeup", "close-up").replace("close up", "close-up")
+    for keyword, index in FRAMING_KEYWORDS:
+        if keyword in shot_type:
+            return index
+    return CAMERA_FRAMINGS.index("medium shot")
+
+
+def tighten_camera(camera, i, num_keyframes):
+    """
+    Camera of keyframe i: the storyboard's camera, tightening step by step over the
+    sequence until the last keyframe reaches the tightest framing.
+    """
+    start = framing_index(camera)
+    last = len(CAMERA_FRAMINGS) - 1
+    index = start + round(i * (last - start) / max(1, num_keyframes - 1))
+    # Keep the storyboard's own wording until the framing actually changes
+    return camera if index == start else CAMERA_FRAMINGS[index]
+
+
+def evolve_pseudo_video(pseudo_video, i, num_keyframes):
+    """
+    State of keyframe i: the storyboard's spec for the first keyframe, then the path,
+    action, camera and emotion advance along the progressions above.
+    """
+    if i == 0:
+        return pseudo_video
+    base = pseudo_video["characters"][0]
+    # Emotion follows the arc over the whole sequence, the rest advances every keyframe
+    phase = min(len(EMOTION_ARC) - 1, i * len(EMOTION_ARC) // max(1, num_keyframes))
+    character = dict(
+        base,
+        action=ACTIONS[i % len(ACTIONS)],
+        path=CHARACTER_PATHS[i % len(CHARACTER_PATHS)],
+        emotion=EMOTION_ARC[phase].format(emotion=base["emotion"]),
+    )
+    return dict(pseudo_video, characters=[character],
+                camera=tighten_camera(pseudo_video["camera"], i, num_keyframes))
+
+
 # Generate natural language transition description
 def generate_transition_description(previous_state, next_state, i):
     # You can replace this with GPT for smarter descriptions
-    return f"Transition {i+1}: The character continues to walk through the {next_state['scene']} with a {next_state['characters'][0]['emotion']} expression."
+    previous, current = previous_state["characters"][0], next_state["characters"][0]
+    text = f"Transition {i+1}: In the {next_state['scene']}, the character goes on to {current['action']}, " \
+           f"moving {describe_path(current['path'])}"
+    if current["emotion"] != previous["emotion"]:
+        text += f", the mood turning {current['emotion']}"
+    else:
+        text += f" with a {current['emotion']} expression"
+    if next_state["camera"] != previous_state["camera"]:
+        text += f"; the camera cuts from a {previous_state['camera']} to a {next_state['camera']}"
+    return text + "."
 
 
 # Convert pseudo-video spec to text prompt
@@ -44,39 +124,133 @@ def pseudo_video_to_prompt(pseudo_video):
 
     prompt = (
         f"Create a {duration}-second video showing a {emotion} scene in a {scene}. "
-        f"A character (represented by emoji) performs the action '{action}' across the screen from {path.replace('_', ' ')}. "
+        f"A character (represented by emoji) performs the action '{action}' {describe_path(path)}. "
         f"Use a {camera} to capture the atmosphere."
     )
     return prompt
 
 
-# Iterative Process
-def build_scene_sequence(storyboard, model_id, num_keyframes=12):
+def _generate_keyframe(model_id, video_prompt):
+    with backend_slot(model_id):
+        return generate_video(video_prompt, model_id)
+
+
+def plan_keyframes(storyboard, num_keyframes=12):
+    """
+    Build the transition text and video prompt for every keyframe up front.
+    """
     pseudo_video = storyboard_to_pseudo_video(storyboard)
     print("Pseudo-Video Spec:\n", json.dumps(pseudo_video, indent=2))
 
     previous_state = pseudo_video
-    scene_sequence = []
+    keyframes = []
 
     for i in range(num_keyframes):
+        # Advance the scene state: path, action, camera and emotion change per keyframe
+        state = evolve_pseudo_video(pseudo_video, i, num_keyframes)
+
         # 1️⃣ Generate transition text
-        transition_text = generate_transition_description(previous_state, pseudo_video, i)
+        transition_text = generate_transition_description(previous_state, state, i)
 
         # 2️⃣ Generate video prompt
-        video_prompt = pseudo_video_to_prompt(pseudo_video)
+        video_prompt = pseudo_video_to_prompt(state)
 
-        # 3️⃣ Generate video clip
-        video_path = generate_video(video_prompt, model_id)
-
-        # 4️⃣ Save this step
-        scene_sequence.append({
+        keyframes.append({
             "transition_text": transition_text,
             "prompt": video_prompt,
-            "video_path": video_path
+            "state": state,
+            "video_path": None
         })
+        previous_state = state
+
+    return keyframes
+
+
+def iter_scene_sequence(storyboard, model_id, num_keyframes=12, max_workers=None, broker=None, user=None,
+                        priority=PRIORITY_BATCH):
+    """
+    Dispatch all keyframe generations at once and yield (index, step) as each finishes.
+
+    The worker pool is bounded by max_workers (default: the backend's concurrency
+    limit); a failed keyframe is yielded with an "error" entry instead of a video path.
+    Wan2.1 keyframes are rendered in micro-batches instead of one pipeline call each.
+    With a worker_pool.JobBroker every keyframe is queued as a job for the worker
+    processes instead, attributed to `user` for fair-share scheduling and queued at `priority`.
+    """
+    keyframes = plan_keyframes(storyboard, num_keyframes)
+    if broker is not None:
+        job_ids = {broker.submit_video_job(step["prompt"], model_id, user=user, priority=priority): i
+                   for i, step in enumerate(keyframes)}
+        for job_id, status in broker.iter_finished(job_ids):
+            i = job_ids[job_id]
+            step = keyframes[i]
+            if status["error"]:
+                print(f"Keyframe {i + 1} failed: {status['error']}")
+                step["error"] = status["error"]
+            else:
+                step["video_path"] = status["result"]
+            yield i, step
+        return
+
+    if model_id == "Wan2.1":
+        with backend_slot(model_id):
+            for i, result in iter_wan_batch([step["prompt"] for step in keyframes]):
+                step = keyframes[i]
+                if isinstance(result, Exception):
+                    print(f"Keyframe {i + 1} failed: {result}")
+                    step["error"] = str(result)
+                else:
+                    step["video_path"] = result
+                yield i, step
+        return
+
+    if max_workers is None:
+        max_workers = BACKEND_CONCURRENCY.get(model_id, 1)
+    max_workers = max(1, min(max_workers, len(keyframes) or 1))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="keyframe") as pool:
+        futures = {
+            pool.submit(_generate_keyframe, model_id, step["prompt"]): i
+            for i, step in enumerate(keyframes)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            step = keyframes[i]
+            try:
+                step["video_path"] = future.result()
+            except Exception as e:
+                print(f"Keyframe {i + 1} failed: {e}")
+                step["error"] = str(e)
+            yield i, step
 
-        # Optional: Update pseudo_video for next iteration if needed
-        # Example: character moves deeper, emotion changes, etc.
+
+# Iterative Process
+@telemetry.instrument("scene_sequence.build")
+def build_scene_sequence(storyboard, model_id, num_keyframes=12, concurrent=False, on_keyframe=None):
+    """
+    Generate one clip per keyframe and return the steps in keyframe order.
+
+    With concurrent=True all keyframes are generated in parallel (see
+    iter_scene_sequence) and on_keyframe(index, step) is called as each one finishes.
+    """
+    if concurrent:
+        scene_sequence = [None] * num_keyframes
+        for i, step in iter_scene_sequence(storyboard, model_id, num_keyframes):
+            scene_sequence[i] = step
+            if on_keyframe is not None:
+                on_keyframe(i, step)
+        return scene_sequence
+
+    scene_sequence = []
+
+    for i, step in enumerate(plan_keyframes(storyboard, num_keyframes)):
+        # 3️⃣ Generate video clip
+        step["video_path"] = _generate_keyframe(model_id, step["prompt"])
+
+        # 4️⃣ Save this step
+        scene_sequence.append(step)
+        if on_keyframe is not None:
+            on_keyframe(i, step)
 
     return scene_sequence
 
@@ -91,7 +265,7 @@ if __name__ == "__main__":
         "emotion": "mysterious"
     }
 
-    scene_sequence = build_scene_sequence(storyboard, model_id="Veo-2", num_keyframes=3)
+    scene_sequence = build_scene_sequence(storyboard, model_id="Veo-2", num_keyframes=3, concurrent=True)
 
     print("\n--- Final Scene Sequence ---")
     for i, step in enumerate(scene_sequence):
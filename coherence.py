@@ -0,0 +1,145 @@
+import time
+
+import cv2
+import numpy as np
+
+# Constants of skimage.metrics.structural_similarity with its defaults on uint8 frames
+WIN_SIZE = 7
+K1 = 0.01
+K2 = 0.03
+DATA_RANGE = 255.0
+# skimage uses the sample (N - 1) covariance over the window
+COV_NORM = WIN_SIZE ** 2 / (WIN_SIZE ** 2 - 1)
+C1 = (K1 * DATA_RANGE) ** 2
+C2 = (K2 * DATA_RANGE) ** 2
+
+
+def _box(image):
+    return cv2.boxFilter(image, -1, (WIN_SIZE, WIN_SIZE), normalize=True, borderType=cv2.BORDER_REFLECT)
+
+
+class FrameStats:
+    """
+    Local statistics of one grayscale frame: the windowed mean and the windowed
+    variance (sample-normalised). They are computed once per frame and reused by both
+    pairs the frame takes part in.
+    """
+
+    def __init__(self, gray, pyramid_level=0):
+        for _ in range(pyramid_level):
+            gray = cv2.pyrDown(gray)
+        # float64 like skimage: E[x^2] - mu^2 cancels badly in float32 on flat, bright frames
+        self.image = gray.astype(np.float64)
+        self.mean = _box(self.image)
+        self.var = COV_NORM * (_box(self.image * self.image) - self.mean * self.mean)
+
+
+def ssim_from_stats(a, b):
+    """
+    Mean SSIM of two frames from their cached FrameStats. Only the cross term
+    E[xy] is filtered per pair. Border pixels within half a window are excluded,
+    as skimage does.
+    """
+    if a.image.shape != b.image.shape:
+        raise ValueError(f"Frame shapes differ: {a.image.shape} vs {b.image.shape}")
+    cov = COV_NORM * (_box(a.image * b.image) - a.mean * b.mean)
+    numerator = (2 * a.mean * b.mean + C1) * (2 * cov + C2)
+    denominator = (a.mean * a.mean + b.mean * b.mean + C1) * (a.var + b.var + C2)
+    pad = (WIN_SIZE - 1) // 2
+    ssim_map = numerator / denominator
+    return float(ssim_map[pad:-pad, pad:-pad].mean())
+
+
+def ssim(gray_a, gray_b, pyramid_level=0):
+    """
+    Drop-in for skimage's structural_similarity(gray_a, gray_b) on uint8 frames.
+    """
+    return ssim_from_stats(FrameStats(gray_a, pyramid_level), FrameStats(gray_b, pyramid_level))
+
+
+class CoherenceEngine:
+    """
+    SSIM between consecutive frames, keeping the previous frame's statistics so each
+    frame is filtered once rather than twice.
+
+    At pyramid_level 0 scores match skimage.metrics.structural_similarity (7x7 uniform
+    window, data_range 255) to within 1e-5 per pair; see compare_with_skimage. Each
+    pyramid level halves both sides with cv2.pyrDown before the statistics are taken.
+    That is about 4x cheaper per level, but the scores are no longer identical.
+    pyrDown smooths away noise, which raises SSIM (strongly on grainy footage), so only
+    compare scores taken at the same level.
+    """
+
+    def __init__(self, pyramid_level=0):
+        self.pyramid_level = pyramid_level
+        self.prev = None
+
+    def push(self, gray):
+        """
+        Add the next frame; returns its SSIM against the previous frame, or None for the first.
+        """
+        stats = FrameStats(gray, self.pyramid_level)
+        score = ssim_from_stats(self.prev, stats) if self.prev is not None else None
+        self.prev = stats
+        return score
+
+
+def compare_with_skimage(video_paths, pyramid_levels=(0, 1), stride=1, max_side=None):
+    """
+    Time the engine against the per-pair skimage baseline on the same decoded frames.
+
+    Returns one row per video and pyramid level with both mean scores, the largest
+    per-pair difference and the speedup.
+    """
+    from skimage.metrics import structural_similarity
+    from video_metrics import FrameConsumer, analyze_video
+
+    class _Collect(FrameConsumer):
+        name = "frames"
+
+        def __init__(self):
+            self.frames = []
+
+        def consume(self, index, frame, gray):
+            self.frames.append(gray)
+
+        def result(self):
+            return self.frames
+
+    rows = []
+    for video_path in video_paths:
+        frames = analyze_video(video_path, [_Collect()], stride, max_side)[_Collect.name]
+        pairs = list(zip(frames, frames[1:]))
+
+        start = time.perf_counter()
+        reference = [structural_similarity(a, b) for a, b in pairs]
+        reference_sec = time.perf_counter() - start
+
+        for level in pyramid_levels:
+            engine = CoherenceEngine(level)
+            start = time.perf_counter()
+            scores = [engine.push(gray) for gray in frames][1:]
+            seconds = time.perf_counter() - start
+            rows.append({
+                "video": video_path,
+                "pyramid_level": level,
+                "score": round(float(np.mean(scores)), 6) if scores else 0,
+                "reference_score": round(float(np.mean(reference)), 6) if reference else 0,
+                "max_abs_diff": float(np.max(np.abs(np.subtract(scores, reference)))) if scores else 0,
+                "seconds": round(seconds, 3),
+                "speedup": round(reference_sec / seconds, 2) if seconds else None,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Compare the SSIM coherence engine with skimage")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--stride", type=int, default=1)
+    parser.add_argument("--max-side", type=int, default=None)
+    args = parser.parse_args()
+    for row in compare_with_skimage(args.videos, stride=args.stride, max_side=args.max_side):
+        print(json.dumps(row))
@@ -1,23 +1,36 @@
 import json
+import threading
+from collections import OrderedDict
+
 import numpy as np
-import cv2
 
 from dotenv import load_dotenv
-from openai import OpenAI
-from transformers import CLIPProcessor, CLIPModel
 from PIL import Image
-from skimage.metrics import structural_similarity as ssim
+
+from lazy import lazy_import, lazy_object
+from llm_cache import CachedChatClient
+from telemetry import telemetry
+from video_metrics import ClipFrameSampler, CoherenceConsumer, MotionConsumer, analyze_video
+
+openai = lazy_import("openai")
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
 
 
 # Load env for OpenAI
 load_dotenv()
-client = OpenAI()
+# Responses are cached on disk (see llm_cache.py)
+client = CachedChatClient(lazy_object("openai client (evaluation)", lambda: openai.OpenAI()))
+async_client = CachedChatClient(lazy_object("openai async client (evaluation)", lambda: openai.AsyncOpenAI()),
+                                is_async=True)
 
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+# CLIP weights are downloaded and loaded on the first scoring call, not at import
+clip_model = lazy_object("clip model", lambda: transformers.CLIPModel.from_pretrained("openai/clip-vit-base-patch32"))
+clip_processor = lazy_object("clip processor",
+                             lambda: transformers.CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32"))
 
 
-def evaluate_with_gpt4(storyboard, video_description):
+def _gpt4_eval_messages(storyboard, video_description):
     system_prompt = (
         "You are a film critic evaluating how well a video matches a storyboard.\n"
         "Rate each of the following from 1 to 10:\n"
@@ -42,83 +55,167 @@ def evaluate_with_gpt4(storyboard, video_description):
         f"Video Description:\n{video_description}"
     )
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+@telemetry.instrument("eval.gpt4")
+def evaluate_with_gpt4(storyboard, video_description):
     response = client.chat.completions.create(
         model="gpt-4o",
         temperature=0.3,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        messages=_gpt4_eval_messages(storyboard, video_description)
     )
 
     content = response.choices[0].message.content.strip()
     return json.loads(content)
 
 
-def compute_clip_similarity(image_path, text_prompt):
-    image = Image.open(image_path).convert("RGB")
-    inputs = clip_processor(text=[text_prompt], images=image, return_tensors="pt", padding=True)
-    outputs = clip_model(**inputs)
-    logits_per_image = outputs.logits_per_image
-    similarity = logits_per_image.softmax(dim=1).item()
-    return similarity
-
-
-def compute_motion_score(video_path):
-    cap = cv2.VideoCapture(video_path)
-    prev_gray = None
-    motion_values = []
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        if prev_gray is not None:
-            flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None,
-                                                 0.5, 3, 15, 3, 5, 1.2, 0)
-            magnitude, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-            motion_values.append(np.mean(magnitude))
-
-        prev_gray = gray
-
-    cap.release()
-    return np.mean(motion_values) if motion_values else 0
-
+@telemetry.instrument("eval.gpt4")
+async def aevaluate_with_gpt4(storyboard, video_description):
+    response = await async_client.chat.completions.create(
+        model="gpt-4o",
+        temperature=0.3,
+        messages=_gpt4_eval_messages(storyboard, video_description)
+    )
 
-def compute_temporal_coherence(video_path):
-    cap = cv2.VideoCapture(video_path)
-    prev_frame = None
-    ssim_scores = []
+    content = response.choices[0].message.content.strip()
+    return json.loads(content)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        if prev_frame is not None:
-            score = ssim(prev_frame, gray)
-            ssim_scores.append(score)
+class ClipScorer:
+    """
+    Batched CLIP scoring of N images against M prompts.
+
+    Forward passes run under torch.inference_mode in chunks of batch_size, text
+    embeddings are cached per prompt, and score() returns an N x M matrix of
+    cosine similarities between L2-normalised image and text embeddings.
+    """
+
+    def __init__(self, model, processor, batch_size=16, max_cached_prompts=512):
+        self.model = model
+        self.processor = processor
+        self.batch_size = batch_size
+        self.max_cached_prompts = max_cached_prompts
+        self._text_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_images(self, images):
+        chunks = []
+        with torch.inference_mode():
+            for start in range(0, len(images), self.batch_size):
+                inputs = self.processor(images=images[start:start + self.batch_size], return_tensors="pt")
+                features = self.model.get_image_features(**inputs)
+                chunks.append(torch.nn.functional.normalize(features.float(), dim=-1))
+        return torch.cat(chunks)
+
+    def embed_texts(self, prompts):
+        # Embeddings are collected locally: other threads may evict cache entries at any time
+        found = {}
+        with self._lock:
+            for prompt in dict.fromkeys(prompts):
+                if prompt in self._text_cache:
+                    self._text_cache.move_to_end(prompt)
+                    found[prompt] = self._text_cache[prompt]
+        missing = [p for p in dict.fromkeys(prompts) if p not in found]
+        with torch.inference_mode():
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                inputs = self.processor(text=batch, return_tensors="pt", padding=True, truncation=True)
+                features = torch.nn.functional.normalize(self.model.get_text_features(**inputs).float(), dim=-1)
+                found.update(zip(batch, features))
+        if missing:
+            with self._lock:
+                for prompt in missing:
+                    self._text_cache[prompt] = found[prompt]
+                while len(self._text_cache) > self.max_cached_prompts:
+                    self._text_cache.popitem(last=False)
+        return torch.stack([found[prompt] for prompt in prompts])
+
+    @telemetry.instrument("eval.clip")
+    def score(self, images, prompts):
+        if not images or not prompts:
+            return np.zeros((len(images), len(prompts)), dtype=np.float32)
+        image_embeddings = self.embed_images(images)
+        text_embeddings = self.embed_texts(prompts)
+        return (image_embeddings @ text_embeddings.T).numpy()
+
+
+clip_scorer = ClipScorer(clip_model, clip_processor)
 
-        prev_frame = gray
 
-    cap.release()
-    return np.mean(ssim_scores) if ssim_scores else 0
+def compute_clip_similarity(image_path, text_prompt):
+    # Accepts a file path or an already decoded PIL image; returns CLIP cosine similarity
+    image = image_path if isinstance(image_path, Image.Image) else Image.open(image_path).convert("RGB")
+    return float(clip_scorer.score([image], [text_prompt])[0, 0])
+
+
+@telemetry.instrument("eval.scene_sequence")
+def score_scene_sequence(scene_sequence, frames_per_clip=4, stride=1, max_side=None):
+    """
+    Prompt adherence for every keyframe of a build_scene_sequence result in one CLIP pass.
+
+    Returns the full frames x prompts similarity matrix plus, per keyframe, the
+    mean similarity of its own frames to its own prompt.
+    """
+    steps = [step for step in scene_sequence if step and step.get("video_path")]
+    frames, owners = [], []
+    for i, step in enumerate(steps):
+        sampled = analyze_video(step["video_path"], [ClipFrameSampler(frames_per_clip)],
+                                stride, max_side)[ClipFrameSampler.name]
+        frames.extend(sampled)
+        owners.extend([i] * len(sampled))
+
+    prompts = [step["prompt"] for step in steps]
+    matrix = clip_scorer.score(frames, prompts)
+    owners = np.array(owners)
+    per_keyframe = [
+        float(matrix[owners == i, i].mean()) if np.any(owners == i) else 0.0
+        for i in range(len(steps))
+    ]
+    return {"similarity_matrix": matrix.tolist(), "keyframe_adherence": per_keyframe}
+
+
+@telemetry.instrument("eval.motion")
+def compute_motion_score(video_path, stride=1, max_side=None, estimator="farneback"):
+    return analyze_video(video_path, [MotionConsumer(estimator)], stride, max_side)[MotionConsumer.name]
+
+
+@telemetry.instrument("eval.coherence")
+def compute_temporal_coherence(video_path, stride=1, max_side=None, pyramid_level=0):
+    return analyze_video(video_path, [CoherenceConsumer(pyramid_level)], stride, max_side)[CoherenceConsumer.name]
+
+
+@telemetry.instrument("eval.video")
+def evaluate_video(storyboard, video_description, video_path, thumbnail_path, text_prompt,
+                   stride=1, max_side=None, num_clip_frames=8, motion_estimator="farneback"):
+    """
+    Score a video with the GPT-4o judge plus CLIP, motion and SSIM metrics.
+
+    The video is decoded once for all frame metrics. CLIP uses the thumbnail when
+    thumbnail_path is given, otherwise the mean over frames sampled during decoding.
+    """
+    gpt_eval = evaluate_with_gpt4(storyboard, video_description)
 
+    consumers = [MotionConsumer(motion_estimator), CoherenceConsumer()]
+    if thumbnail_path is None:
+        consumers.append(ClipFrameSampler(num_clip_frames))
+    with telemetry.span("eval.frame_metrics"):
+        frame_metrics = analyze_video(video_path, consumers, stride, max_side)
 
-def evaluate_video(storyboard, video_description, video_path, thumbnail_path, text_prompt):
-    gpt_eval = evaluate_with_gpt4(storyboard, video_description)
-    clip_score = compute_clip_similarity(thumbnail_path, text_prompt)
-    motion_score = compute_motion_score(video_path)
-    coherence_score = compute_temporal_coherence(video_path)
+    if thumbnail_path is None:
+        frames = frame_metrics[ClipFrameSampler.name]
+        clip_score = float(clip_scorer.score(frames, [text_prompt]).mean()) if frames else 0
+    else:
+        clip_score = compute_clip_similarity(thumbnail_path, text_prompt)
 
     return {
         "gpt_eval": gpt_eval,
         "metrics": {
             "clip_similarity": clip_score,
-            "motion_score": motion_score,
-            "temporal_coherence": coherence_score
+            "motion_score": frame_metrics[MotionConsumer.name],
+            "temporal_coherence": frame_metrics[CoherenceConsumer.name]
         }
     }
@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import os
+import queue
+import threading
+import uuid
+
+from lazy import lazy_import
+from telemetry import telemetry
+
+google_crc32c = lazy_import("google_crc32c")
+
+
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def _new_hasher(blob):
+    # Composite objects have no MD5, only CRC32C
+    if blob.md5_hash:
+        return "md5", hashlib.md5(), blob.md5_hash
+    if blob.crc32c:
+        return "crc32c", google_crc32c.Checksum(), blob.crc32c
+    return None, None, None
+
+
+def download_blob(blob, local_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Stream a blob to local_path in chunks and verify its checksum.
+
+    Data is written to a temporary file next to the target and renamed into place
+    only after the MD5 (or CRC32C) matches the object's metadata.
+    """
+    blob.reload()
+    algorithm, hasher, expected = _new_hasher(blob)
+
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    tmp_path = f"{local_path}.{uuid.uuid4().hex}.part"
+    try:
+        with blob.open("rb", chunk_size=chunk_size) as src, open(tmp_path, "wb") as dst:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                if hasher is not None:
+                    hasher.update(chunk)
+                dst.write(chunk)
+
+        if hasher is not None:
+            actual = base64.b64encode(hasher.digest()).decode("ascii")
+            if actual != expected:
+                raise ChecksumMismatch(f"{algorithm} mismatch for {blob.name}: expected {expected}, got {actual}")
+        os.replace(tmp_path, local_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return local_path
+
+
+class CleanupQueue:
+    """
+    Deletes blobs on a background thread so removal is off the request path.
+    """
+
+    def __init__(self, max_attempts=3):
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="gcs-cleanup", daemon=True)
+                self._thread.start()
+
+    def delete(self, blob):
+        self._ensure_worker()
+        self._queue.put((blob, 1))
+
+    def _run(self):
+        while True:
+            blob, attempt = self._queue.get()
+            try:
+                blob.delete()
+                print(f"Video deleted from GCS: gs://{blob.bucket.name}/{blob.name}")
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    self._queue.put((blob, attempt + 1))
+                else:
+                    print(f"Giving up deleting gs://{blob.bucket.name}/{blob.name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """
+        Block until every queued deletion has been attempted.
+        """
+        self._queue.join()
+
+    def pending(self):
+        return self._queue.qsize()
+
+
+cleanup_queue = CleanupQueue()
+telemetry.gauge("gcs_cleanup_pending", cleanup_queue.pending, "GCS objects queued for deletion")
@@ -1,68 +1,304 @@
+import asyncio
 import uuid
-
-import torch
-from diffusers.utils import export_to_video
-from diffusers import AutoencoderKLWan, WanPipeline
-from diffusers.schedulers.scheduling_unipc_multistep import UniPCMultistepScheduler
+from contextlib import contextmanager
 
 import os
+import threading
 import time
-import requests
 import json
 
-from PIL import Image as PIL_Image
-from google import genai
-from google.genai import types
-from google.cloud import aiplatform
-from google.cloud import storage
-import matplotlib.pyplot as plt
-import mediapy as media
-
-
-def wan_text_to_video(prompt, negative_prompt):
-    # Available models: Wan-AI/Wan2.1-T2V-14B-Diffusers, Wan-AI/Wan2.1-T2V-1.3B-Diffusers
-    # model_id = "Wan-AI/Wan2.1-T2V-14B-Diffusers"
-    model_id = "Wan-AI/Wan2.1-T2V-1.3B-Diffusers"
-    vae = AutoencoderKLWan.from_pretrained(model_id, subfolder="vae", torch_dtype=torch.float32)
-    flow_shift = 5.0  # 5.0 for 720P, 3.0 for 480P
-    scheduler = UniPCMultistepScheduler(prediction_type='flow_prediction', use_flow_sigmas=True, num_train_timesteps=1000, flow_shift=flow_shift)
-    pipe = WanPipeline.from_pretrained(model_id, vae=vae, torch_dtype=torch.bfloat16)
-    pipe.scheduler = scheduler
-    pipe.to("cpu")
-
-    prompt = ("A cat and a dog baking a cake together in a kitchen. The cat is carefully measuring flour, while the "
-              "dog is stirring the batter with a wooden spoon. The kitchen is cozy, with sunlight streaming through "
-              "the window.")
-    negative_prompt = ("Bright tones, overexposed, static, blurred details, subtitles, style, works, paintings, "
-                       "images, static, overall gray, worst quality, low quality, JPEG compression residue, ugly, "
-                       "incomplete, extra fingers, poorly drawn hands, poorly drawn faces, deformed, disfigured, "
-                       "misshapen limbs, fused fingers, still picture, messy background, three legs, many people in "
-                       "the background, walking backwards")
-
-    output = pipe(
-         prompt=prompt,
-         negative_prompt=negative_prompt,
-         height=720,
-         width=1280,
-         num_frames=81,
-         guidance_scale=5.0,
-        ).frames[0]
-    export_to_video(output, "output.mp4", fps=16)
-
-    return "output.mp4"
-
-
-def gcp_veo(prompt: str = "a cat reading a book"):
-    PROJECT_ID = "gcp-credit-applying-to-g-suite"
-    LOCATION = os.environ.get("GOOGLE_CLOUD_REGION", "us-central1")
-    BUCKET_NAME = "dante-test-123456-output"
-    OUTPUT_GCS_PATH = f"gs://{BUCKET_NAME}/videos/output_{int(time.time())}.mp4"
+from gcs_io import cleanup_queue, download_blob
+from job_queue import Backoff, job_manager
+from lazy import lazy_import
+from pipeline_registry import DEFAULT_WAN_MODEL_ID, registry
+from result_cache import video_cache
+from telemetry import telemetry
+from video_export import video_exporter
+
+# Backend SDKs are imported on first use so the app starts without paying for them
+hailuo_client = lazy_import("hailuo_client")
+genai = lazy_import("google.genai")
+types = lazy_import("google.genai.types")
+aiplatform = lazy_import("google.cloud.aiplatform")
+storage = lazy_import("google.cloud.storage")
+diffusers_utils = lazy_import("diffusers.utils")
+torch = lazy_import("torch")
+
+
+WAN_DEFAULT_NEGATIVE_PROMPT = ("Bright tones, overexposed, static, blurred details, subtitles, style, works, paintings, "
+                               "images, static, overall gray, worst quality, low quality, JPEG compression residue, ugly, "
+                               "incomplete, extra fingers, poorly drawn hands, poorly drawn faces, deformed, disfigured, "
+                               "misshapen limbs, fused fingers, still picture, messy background, three legs, many people "
+                               "in the background, walking backwards")
+# UMT5 prompt length WanPipeline pads to by default
+WAN_MAX_SEQUENCE_LENGTH = 512
+
+# Quality presets for Wan2.1; flow_shift is 3.0 for 480P and 5.0 for 720P
+WAN_PRESETS = {
+    "draft": {"height": 480, "width": 832, "num_frames": 33, "num_inference_steps": 20,
+              "guidance_scale": 5.0, "flow_shift": 3.0},
+    "preview": {"height": 480, "width": 832, "num_frames": 81, "num_inference_steps": 30,
+                "guidance_scale": 5.0, "flow_shift": 3.0},
+    "final": {"height": 720, "width": 1280, "num_frames": 81, "num_inference_steps": 50,
+              "guidance_scale": 5.0, "flow_shift": 5.0},
+}
+DEFAULT_WAN_PRESET = "final"
+
+
+def _wan_output_path():
+    os.makedirs("output", exist_ok=True)
+    return f"output/wan-{uuid.uuid4().hex}.mp4"
+
+
+def _wan_generator(seed):
+    return torch.Generator().manual_seed(int(seed)) if seed is not None else None
+
+
+@contextmanager
+def _render_slot(entry):
+    # Time spent waiting for another render on the same pipeline is reported as wan.queue
+    with telemetry.span("wan.queue"):
+        entry.lock.acquire()
+    try:
+        yield
+    finally:
+        entry.lock.release()
+
+
+def _wan_entry(model_id):
+    with telemetry.span("wan.load"):
+        return registry.get(model_id)
+
+
+def _wan_prompt_embeds(entry, prompts, negative_prompts):
+    # Text encoding goes through the entry's embedding cache, so the shared negative
+    # prompt and repeated prompts are encoded once per pipeline
+    negative_prompts = [negative or WAN_DEFAULT_NEGATIVE_PROMPT for negative in negative_prompts]
+    with telemetry.span("wan.encode_prompt", batch_size=len(prompts)):
+        return {
+            "prompt_embeds": entry.embeddings.encode(entry.pipe, list(prompts), WAN_MAX_SEQUENCE_LENGTH),
+            "negative_prompt_embeds": entry.embeddings.encode(entry.pipe, negative_prompts, WAN_MAX_SEQUENCE_LENGTH),
+        }
 
-    # Initialize Vertex AI
-    aiplatform.init(project=PROJECT_ID, location=LOCATION)
 
-    # Initialize Generative AI client
-    client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+def _wan_step_callback(progress, num_inference_steps):
+    # callback_on_step_end hook reporting (step, total) after every denoising step
+    if progress is None:
+        return {}
+
+    def on_step_end(pipe, step, timestep, callback_kwargs):
+        total = getattr(pipe, "num_timesteps", None) or num_inference_steps
+        progress(step + 1, total)
+        return callback_kwargs
+
+    return {"callback_on_step_end": on_step_end}
+
+
+def _wan_export(frames):
+    with telemetry.span("wan.export"):
+        return video_exporter.export(frames, _wan_output_path(), fps=16).result()
+
+
+@telemetry.instrument("wan.text_to_video")
+def wan_text_to_video(prompt, negative_prompt, model_id=DEFAULT_WAN_MODEL_ID, preset=DEFAULT_WAN_PRESET, seed=None,
+                      progress=None):
+    # Pipelines are loaded once per process and shared through the registry;
+    # progress(step, total) is called after every denoising step
+    entry = _wan_entry(model_id)
+    settings = dict(WAN_PRESETS[preset])
+    flow_shift = settings.pop("flow_shift")
+
+    with _render_slot(entry), telemetry.span("wan.denoise"):
+        entry.set_flow_shift(flow_shift)
+        output = entry.pipe(
+             **_wan_prompt_embeds(entry, [prompt], [negative_prompt]),
+             generator=_wan_generator(seed),
+             **_wan_step_callback(progress, settings["num_inference_steps"]),
+             **settings
+            ).frames[0]
+    # Encoding runs on the exporter's threads; the pipeline lock is already released,
+    # so the next render can start while this clip is still being written
+    return _wan_export(output)
+
+
+@telemetry.instrument("wan.refine")
+def wan_refine_video(video_path, prompt, negative_prompt=None, model_id=DEFAULT_WAN_MODEL_ID,
+                     preset=DEFAULT_WAN_PRESET, strength=0.6, seed=None, progress=None):
+    """
+    Second half of the draft-then-upscale workflow: re-render an approved draft at the
+    preset's resolution with video-to-video denoising, so only `strength` of the steps run
+    and the draft's composition and motion are kept. The frame count follows the draft.
+    """
+    entry = _wan_entry(model_id)
+    settings = dict(WAN_PRESETS[preset])
+    flow_shift = settings.pop("flow_shift")
+    settings.pop("num_frames")
+    video = diffusers_utils.load_video(video_path)
+
+    with _render_slot(entry), telemetry.span("wan.denoise"):
+        entry.set_flow_shift(flow_shift)
+        output = entry.video_to_video(
+             video=video,
+             **_wan_prompt_embeds(entry, [prompt], [negative_prompt]),
+             strength=strength,
+             generator=_wan_generator(seed),
+             **_wan_step_callback(progress, int(settings["num_inference_steps"] * strength)),
+             **settings
+            ).frames[0]
+    # Encoding runs on the exporter's threads; the pipeline lock is already released,
+    # so the next render can start while this clip is still being written
+    return _wan_export(output)
+
+
+# Memory (GB) a single Wan micro-batch may use for activations, override with WAN_BATCH_MEMORY_GB
+WAN_BATCH_MEMORY_GB = float(os.environ.get("WAN_BATCH_MEMORY_GB", "16"))
+# Rough multiplier from one hidden-state tensor to peak transformer + VAE decode activations
+_WAN_ACTIVATION_FACTOR = 24
+
+
+def wan_micro_batch_size(entry, preset=DEFAULT_WAN_PRESET, memory_budget_gb=WAN_BATCH_MEMORY_GB):
+    """
+    Estimate how many clips of the preset fit in one denoising loop under the budget.
+
+    The estimate counts transformer tokens (latents are 4x temporally and 8x spatially
+    compressed, then 2x2 patchified) times the hidden size, scaled by a fixed factor.
+    """
+    settings = WAN_PRESETS[preset]
+    latent_frames = (settings["num_frames"] - 1) // 4 + 1
+    tokens = latent_frames * (settings["height"] // 16) * (settings["width"] // 16)
+    config = entry.pipe.transformer.config
+    hidden_size = config.num_attention_heads * config.attention_head_dim
+    per_clip_bytes = tokens * hidden_size * entry.pipe.transformer.dtype.itemsize * _WAN_ACTIVATION_FACTOR
+    return max(1, int(memory_budget_gb * 1024 ** 3 // per_clip_bytes))
+
+
+@telemetry.instrument("wan.batch_text_to_video")
+def wan_batch_text_to_video(prompts, negative_prompts=None, model_id=DEFAULT_WAN_MODEL_ID,
+                            preset=DEFAULT_WAN_PRESET, seed=None):
+    """
+    Render several prompts in one denoising loop and export each clip separately.
+
+    Each clip gets its own generator seeded with `seed`, so a clip matches what
+    wan_text_to_video would produce for the same prompt and seed.
+    """
+    entry = _wan_entry(model_id)
+    settings = dict(WAN_PRESETS[preset])
+    flow_shift = settings.pop("flow_shift")
+    negative_prompts = negative_prompts or [None] * len(prompts)
+    generators = [_wan_generator(seed) for _ in prompts] if seed is not None else None
+
+    with _render_slot(entry), telemetry.span("wan.denoise", batch_size=len(prompts)):
+        entry.set_flow_shift(flow_shift)
+        videos = entry.pipe(
+             **_wan_prompt_embeds(entry, prompts, negative_prompts),
+             generator=generators,
+             **settings
+            ).frames
+
+    with telemetry.span("wan.export"):
+        exports = [video_exporter.export(output, _wan_output_path(), fps=16) for output in videos]
+        return [export.result() for export in exports]
+
+
+def iter_wan_batch(prompts, negative_prompts=None, model_id=DEFAULT_WAN_MODEL_ID, preset=DEFAULT_WAN_PRESET,
+                   seed=None, memory_budget_gb=WAN_BATCH_MEMORY_GB):
+    """
+    Generate many Wan clips, yielding (index, path) as each micro-batch finishes.
+
+    Cached clips are yielded first, duplicate prompts are rendered once, and the
+    remaining prompts are packed into micro-batches sized by wan_micro_batch_size.
+    A failed micro-batch yields (index, exception) for each of its prompts.
+    """
+    negative_prompts = negative_prompts or [None] * len(prompts)
+    # The default checkpoint shares cache entries with submit_video_job's "Wan2.1" renders;
+    # any other checkpoint is keyed by its own id
+    cache_model_id = "Wan2.1" if model_id == DEFAULT_WAN_MODEL_ID else model_id
+    pending = {}
+    for i, (prompt, negative_prompt) in enumerate(zip(prompts, negative_prompts)):
+        key = video_cache.make_key(cache_model_id, prompt, negative_prompt, preset=preset, seed=seed)
+        cached = video_cache.get(key)
+        if cached:
+            yield i, cached
+        else:
+            pending.setdefault(key, []).append(i)
+    if not pending:
+        return
+
+    keys = list(pending)
+    batch_size = wan_micro_batch_size(registry.get(model_id), preset, memory_budget_gb)
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        firsts = [pending[key][0] for key in chunk]
+        try:
+            paths = wan_batch_text_to_video([prompts[i] for i in firsts], [negative_prompts[i] for i in firsts],
+                                            model_id=model_id, preset=preset, seed=seed)
+        except Exception as e:
+            for key in chunk:
+                for i in pending[key]:
+                    yield i, e
+            continue
+
+        for key, i, path in zip(chunk, firsts, paths):
+            if video_cache.enabled:
+                metadata = {"model_id": cache_model_id, "prompt": prompts[i], "negative_prompt": negative_prompts[i],
+                            "params": {"preset": preset, "seed": seed}}
+                path = video_cache.put(key, path, metadata)
+            for index in pending[key]:
+                yield index, path
+
+
+# First poll delay for remote (Veo / Hailuo) jobs; the delay then grows up to 30s
+REMOTE_POLL_INITIAL_SEC = float(os.environ.get("REMOTE_POLL_INITIAL_SEC", "5"))
+
+PROJECT_ID = "gcp-credit-applying-to-g-suite"
+BUCKET_NAME = "dante-test-123456-output"
+
+# Vertex/genai/storage clients are created once and reused by every Veo job
+_gcp_clients = {}
+_gcp_clients_lock = threading.Lock()
+
+
+def get_genai_client():
+    with _gcp_clients_lock:
+        if "genai" not in _gcp_clients:
+            LOCATION = os.environ.get("GOOGLE_CLOUD_REGION", "us-central1")
+
+            # Initialize Vertex AI
+            aiplatform.init(project=PROJECT_ID, location=LOCATION)
+
+            # Initialize Generative AI client
+            _gcp_clients["genai"] = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+        return _gcp_clients["genai"]
+
+
+def get_storage_client():
+    # Set STORAGE_EMULATOR_HOST to run against a local fake GCS server
+    with _gcp_clients_lock:
+        if "storage" not in _gcp_clients:
+            _gcp_clients["storage"] = storage.Client(project=PROJECT_ID)
+        return _gcp_clients["storage"]
+
+
+def set_gcp_clients(genai_client=None, storage_client=None):
+    """
+    Replace the pooled clients, e.g. with fakes for local testing and benchmarks.
+    """
+    with _gcp_clients_lock:
+        if genai_client is not None:
+            _gcp_clients["genai"] = genai_client
+        if storage_client is not None:
+            _gcp_clients["storage"] = storage_client
+
+
+@telemetry.instrument("veo.submit")
+def veo_submit(prompt: str):
+    """
+    Start a Veo generation and return (client, operation) without waiting for it.
+    """
+    # Unique per job so concurrent generations never share an output object
+    OUTPUT_GCS_PATH = f"gs://{BUCKET_NAME}/videos/output_{int(time.time())}_{uuid.uuid4().hex[:8]}.mp4"
+
+    client = get_genai_client()
 
     # Video Generation Pipeline
     video_model = "veo-2.0-generate-001"
@@ -81,14 +317,19 @@ def gcp_veo(prompt: str = "a cat reading a book"):
             enhance_prompt=True,
         ),
     )
+    return client, operation
 
-    # Poll until operation is complete
-    print("Generating video...")
-    while not operation.done:
-        time.sleep(15)
-        operation = client.operations.get(operation)
-        print(f"Operation status: {operation}")
 
+@telemetry.instrument("veo.poll")
+def veo_poll(client, operation):
+    return client.operations.get(operation)
+
+
+@telemetry.instrument("veo.download")
+def veo_download(operation):
+    """
+    Stream the finished operation's video from GCS and queue the remote copy for deletion.
+    """
     # Error Handling
     if operation.error:
         raise Exception(f"Video generation failed: {operation.error}")
@@ -99,122 +340,241 @@ def gcp_veo(prompt: str = "a cat reading a book"):
         print(f"Video generated at: {video_uri}")
 
         # Download the video from GCS to local
-        storage_client = storage.Client(project=PROJECT_ID)
-        bucket = storage_client.bucket(BUCKET_NAME)
+        bucket = get_storage_client().bucket(BUCKET_NAME)
         blob_name = video_uri.replace(f"gs://{BUCKET_NAME}/", "")
         blob = bucket.blob(blob_name)
 
         local_output_path = f"output/sample-{uuid.uuid1()}.mp4"
 
-        # Ensure local directory exists
-        os.makedirs(os.path.dirname(local_output_path), exist_ok=True)
-
-        # Download the video
-        blob.download_to_filename(local_output_path)
+        # Download the video in chunks, verifying the checksum
+        download_blob(blob, local_output_path)
         print(f"Video downloaded to: {local_output_path}")
 
-        # Delete the file from GCS
-        blob.delete()
-        print(f"Video deleted from GCS: {video_uri}")
+        # Delete the file from GCS in the background
+        cleanup_queue.delete(blob)
 
         return local_output_path
     else:
         raise Exception("No video generated or response is empty")
 
 
-def hailuo_text_to_video(
-        prompt: str,
-        model: str = "T2V-01-Director",
-        output_file_name: str = "output.mp4",
-        api_key: str = ""
-) -> str:
-    def invoke_video_generation()->str:
-        print("-----------------Submit video generation task-----------------")
-        url = "https://api.minimaxi.chat/v1/video_generation"
-        payload = json.dumps({
-          "prompt": prompt,
-          "model": model
-        })
-        headers = {
-          'authorization': 'Bearer ' + api_key,
-          'content-type': 'application/json',
-        }
+@telemetry.instrument("veo.generate")
+def gcp_veo(prompt: str = "a cat reading a book"):
+    client, operation = veo_submit(prompt)
 
-        response = requests.request("POST", url, headers=headers, data=payload)
-        print(response.text)
-        task_id = response.json()['task_id']
-        print("Video generation task submitted successfully, task ID.："+task_id)
-        return task_id
+    # Poll until operation is complete
+    print("Generating video...")
+    while not operation.done:
+        time.sleep(15)
+        operation = veo_poll(client, operation)
+        print(f"Operation status: {operation}")
 
-    def query_video_generation(task_id: str):
-        url = "https://api.minimaxi.chat/v1/query/video_generation?task_id="+task_id
-        headers = {
-          'authorization': 'Bearer ' + api_key
-        }
-        response = requests.request("GET", url, headers=headers)
-        status = response.json()['status']
-        if status == 'Preparing':
-            print("...Preparing...")
-            return "", 'Preparing'
-        elif status == 'Queueing':
-            print("...In the queue...")
-            return "", 'Queueing'
-        elif status == 'Processing':
-            print("...Generating...")
-            return "", 'Processing'
-        elif status == 'Success':
-            return response.json()['file_id'], "Finished"
-        elif status == 'Fail':
-            return "", "Fail"
-        else:
-            return "", "Unknown"
+    return veo_download(operation)
 
 
-    def fetch_video_result(file_id: str):
-        print("---------------Video generated successfully, downloading now---------------")
-        url = "https://api.minimaxi.chat/v1/files/retrieve?file_id="+file_id
-        headers = {
-            'authorization': 'Bearer '+api_key,
-        }
+def _job_progress(job):
+    # progress callback for the Wan functions, surfaced through get_video_job / watch_video_job
+    def report(step, total):
+        job.update("denoising", f"step {step}/{total}", progress=round(step / total, 3))
+    return report
 
-        response = requests.request("GET", url, headers=headers)
-        print(response.text)
 
-        download_url = response.json()['file']['download_url']
-        print("Video download link：" + download_url)
-        with open(output_file_name, 'wb') as f:
-            f.write(requests.get(download_url).content)
-        print("THe video has been downloaded in："+os.getcwd()+'/'+output_file_name)
+async def gcp_veo_async(job, prompt: str):
+    client, operation = await asyncio.to_thread(veo_submit, prompt)
+    job.update("polling", "Veo operation submitted")
+    backoff = Backoff(initial=REMOTE_POLL_INITIAL_SEC, maximum=30.0)
+    # Remote queueing plus render time, as seen through polling
+    with telemetry.span("veo.remote"):
+        while not operation.done:
+            await backoff.sleep()
+            operation = await asyncio.to_thread(veo_poll, client, operation)
+    job.update("downloading")
+    return await asyncio.to_thread(veo_download, operation)
 
 
-    task_id = invoke_video_generation()
+@telemetry.instrument("hailuo.generate")
+def hailuo_text_to_video(
+        prompt: str,
+        model: str = "T2V-01-Director",
+        output_file_name: str = None,
+        api_key: str = None
+) -> str:
+    client = hailuo_client.get_hailuo_client(api_key)
+    task_id = client.submit(prompt, model)
     print("-----------------Video generation task submitted -----------------")
     while True:
         time.sleep(10)
 
-        file_id, status = query_video_generation(task_id)
+        file_id, status = client.query(task_id)
         if file_id != "":
-            fetch_video_result(file_id)
+            output_path = client.fetch(file_id, output_file_name)
             print("---------------Successful---------------")
-            break
+            return output_path
         elif status == "Fail" or status == "Unknown":
             print("---------------Failed---------------")
-            break
+            raise Exception(f"Hailuo generation failed with status: {status}")
 
-    return os.getcwd()+'/'+output_file_name
 
-def generate_video(prompt, model_id, negative_prompt=None):
-    video_path = None
+async def hailuo_text_to_video_async(
+        job,
+        prompt: str,
+        model: str = "T2V-01-Director",
+        api_key: str = None
+) -> str:
+    client = hailuo_client.get_hailuo_client(api_key)
+    task_id = await asyncio.to_thread(client.submit, prompt, model)
+    backoff = Backoff(initial=REMOTE_POLL_INITIAL_SEC, maximum=30.0)
+    # Remote queueing plus render time, as seen through polling
+    with telemetry.span("hailuo.remote"):
+        while True:
+            await backoff.sleep()
+            file_id, status = await asyncio.to_thread(client.query, task_id)
+            job.update("polling", status)
+            if file_id != "":
+                break
+            elif status == "Fail" or status == "Unknown":
+                raise Exception(f"Hailuo generation failed with status: {status}")
+    job.update("downloading")
+    return await asyncio.to_thread(client.fetch, file_id)
+
+
+def submit_video_job(prompt, model_id, negative_prompt=None, preset=DEFAULT_WAN_PRESET, seed=None):
+    """
+    Queue a generation on the shared job manager and return its job id immediately.
+    Use get_video_job() to poll and generate_video() for the blocking variant.
+    preset and seed only apply to Wan2.1.
+    """
+    params = {}
     if model_id == "Wan2.1":
-        video_path = wan_text_to_video(prompt, negative_prompt)
+        params = {"preset": preset, "seed": seed}
+
+        async def job_fn(job):
+            return await asyncio.to_thread(wan_text_to_video, prompt, negative_prompt, preset=preset, seed=seed,
+                                           progress=_job_progress(job))
     elif model_id == "SkyReels-V2":
         raise ValueError("SkyReels-V2 model not yet implemented.")
     elif model_id == "Veo-2":
-        video_path = gcp_veo(prompt)
+        async def job_fn(job):
+            return await gcp_veo_async(job, prompt)
     elif model_id == "T2V-01-Director":
-        video_path = hailuo_text_to_video(prompt)
+        async def job_fn(job):
+            return await hailuo_text_to_video_async(job, prompt)
+    else:
+        raise ValueError(f"Unknown model: {model_id}")
+
+    return _submit_cached(job_fn, model_id, prompt, negative_prompt, params)
+
+
+def _submit_cached(job_fn, model_id, prompt, negative_prompt, params):
+    # Identical requests are served from (or wait on) the content-addressed cache
+    key = video_cache.make_key(model_id, prompt, negative_prompt, **params)
+    metadata = {"model_id": model_id, "prompt": prompt, "negative_prompt": negative_prompt, "params": params}
+
+    async def cached_job_fn(job):
+        # Every span opened by this job lands in its trace (see get_video_job()["timings"])
+        with telemetry.trace(job.id, model_id=model_id), telemetry.span("job", model=model_id):
+            return await video_cache.aget_or_create(key, lambda: job_fn(job), metadata)
+
+    return job_manager.submit(cached_job_fn, model_id, prompt)
+
+
+def submit_refine_job(video_path, prompt, negative_prompt=None, preset=DEFAULT_WAN_PRESET, strength=0.6, seed=None):
+    """
+    Queue wan_refine_video for a Wan draft and return the job id.
+    """
+    params = {"source": os.path.basename(video_path), "preset": preset, "strength": strength, "seed": seed}
+
+    async def job_fn(job):
+        return await asyncio.to_thread(wan_refine_video, video_path, prompt, negative_prompt,
+                                       preset=preset, strength=strength, seed=seed, progress=_job_progress(job))
+
+    return _submit_cached(job_fn, "Wan2.1-refine", prompt, negative_prompt, params)
+
+
+def get_video_job(job_id):
+    """
+    Return the job status dict; "result" holds the video path once status is "done"
+    and "timings" the per-stage breakdown recorded so far.
+    """
+    status = job_manager.status(job_id)
+    status["timings"] = telemetry.get_trace(job_id)
+    return status
+
+
+def watch_video_job(job_id, interval=0.5):
+    """
+    Yield get_video_job-style status dicts as the job progresses (status, denoising
+    step, remote poll status); the last one yielded is the finished job.
+    """
+    for status in job_manager.watch(job_id, interval):
+        status["timings"] = telemetry.get_trace(job_id)
+        yield status
+
+
+# Max simultaneous generations per backend; local Wan renders are CPU bound,
+# remote backends are limited by provider quota
+BACKEND_CONCURRENCY = {
+    "Wan2.1": int(os.environ.get("WAN_CONCURRENCY", "1")),
+    "Veo-2": int(os.environ.get("VEO_CONCURRENCY", "4")),
+    "T2V-01-Director": int(os.environ.get("HAILUO_CONCURRENCY", "4")),
+}
+_backend_slots = {model_id: threading.BoundedSemaphore(limit) for model_id, limit in BACKEND_CONCURRENCY.items()}
+
+
+@contextmanager
+def backend_slot(model_id):
+    """
+    Hold one of the backend's concurrency slots for the duration of the block.
+    """
+    slot = _backend_slots.get(model_id)
+    if slot is None:
+        yield
+        return
+    with telemetry.track("backend_waiting", backend=model_id), telemetry.span("backend.queue", backend=model_id):
+        slot.acquire()
+    try:
+        with telemetry.track("backend_active", backend=model_id):
+            yield
+    finally:
+        slot.release()
+
+
+def generate_video(prompt, model_id, negative_prompt=None, preset=DEFAULT_WAN_PRESET, seed=None):
+    video_path = None
+    if model_id in ("Wan2.1", "SkyReels-V2", "Veo-2", "T2V-01-Director"):
+        with telemetry.span("generate_video", model=model_id):
+            job_id = submit_video_job(prompt, model_id, negative_prompt, preset, seed)
+            video_path = job_manager.result(job_id)
     return video_path
 
+
+def generate_videos(prompts, model_id, negative_prompts=None, preset=DEFAULT_WAN_PRESET, seed=None):
+    """
+    Generate one clip per prompt and return the paths in prompt order.
+
+    Wan2.1 prompts are rendered in memory-budgeted micro-batches; remote backends are
+    submitted to the job manager all at once. Raises the first failure.
+    """
+    if model_id == "Wan2.1":
+        paths = [None] * len(prompts)
+        for i, result in iter_wan_batch(prompts, negative_prompts, preset=preset, seed=seed):
+            if isinstance(result, Exception):
+                raise result
+            paths[i] = result
+        return paths
+
+    negative_prompts = negative_prompts or [None] * len(prompts)
+    job_ids = [submit_video_job(prompt, model_id, negative_prompt, preset, seed)
+               for prompt, negative_prompt in zip(prompts, negative_prompts)]
+    return [job_manager.result(job_id) for job_id in job_ids]
+
+
+def refine_video(video_path, prompt, negative_prompt=None, preset=DEFAULT_WAN_PRESET, strength=0.6, seed=None):
+    """
+    Blocking variant of submit_refine_job: upgrade a Wan draft to the given preset.
+    """
+    return job_manager.result(submit_refine_job(video_path, prompt, negative_prompt, preset, strength, seed))
+
 # Only available for cuda / cpu
 # wan_text_to_video()
 
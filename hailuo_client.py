@@ -0,0 +1,175 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from telemetry import telemetry
+
+
+HAILUO_BASE_URL = os.environ.get("HAILUO_BASE_URL", "https://api.minimaxi.chat/v1")
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Non-idempotent requests (task submission) are only retried when the server cannot have acted on them
+RETRY_STATUS_CODES_NON_IDEMPOTENT = {429}
+
+
+def _is_connect_error(error):
+    # The connection was never established, so the request was not sent
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class HailuoError(Exception):
+    pass
+
+
+class HailuoClient:
+    """
+    MiniMax Hailuo video API client on a pooled keep-alive requests.Session.
+
+    Failed requests (connection errors, timeouts, 429 and 5xx) are retried up to
+    max_retries times with exponential backoff and full jitter. Task submission is
+    not idempotent, so it is only retried on connect errors and 429. Pass `adapter` (any requests
+    transport adapter) to serve the API from a mock in tests and load tests.
+    """
+
+    def __init__(self, api_key=None, base_url=HAILUO_BASE_URL, max_retries=4, backoff_base=0.5,
+                 backoff_max=20.0, timeout=30, pool_size=32, adapter=None):
+        self.api_key = api_key if api_key is not None else os.environ.get("MINIMAX_API_KEY", "")
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _headers(self):
+        return {'authorization': 'Bearer ' + self.api_key}
+
+    def _sleep_before_retry(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        time.sleep(delay)
+
+    def request(self, method, url, idempotent=True, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        retry_status_codes = RETRY_STATUS_CODES if idempotent else RETRY_STATUS_CODES_NON_IDEMPOTENT
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries or not (idempotent or _is_connect_error(e)):
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            if response.status_code in retry_status_codes and attempt < self.max_retries:
+                response.close()
+                self._sleep_before_retry(attempt, response)
+                continue
+            response.raise_for_status()
+            return response
+
+    @telemetry.instrument("hailuo.submit")
+    def submit(self, prompt: str, model: str = "T2V-01-Director") -> str:
+        print("-----------------Submit video generation task-----------------")
+        headers = self._headers()
+        headers['content-type'] = 'application/json'
+        # A retried submit after a read timeout or 5xx could start a second paid generation
+        response = self.request("POST", f"{self.base_url}/video_generation", idempotent=False, headers=headers,
+                                data=json.dumps({"prompt": prompt, "model": model}))
+        print(response.text)
+        task_id = response.json().get('task_id')
+        if not task_id:
+            raise HailuoError(f"Video generation task was not accepted: {response.text}")
+        print("Video generation task submitted successfully, task ID.："+task_id)
+        return task_id
+
+    @telemetry.instrument("hailuo.query")
+    def query(self, task_id: str):
+        response = self.request("GET", f"{self.base_url}/query/video_generation",
+                                headers=self._headers(), params={"task_id": task_id})
+        body = response.json()
+        status = body['status']
+        if status == 'Preparing':
+            print("...Preparing...")
+            return "", 'Preparing'
+        elif status == 'Queueing':
+            print("...In the queue...")
+            return "", 'Queueing'
+        elif status == 'Processing':
+            print("...Generating...")
+            return "", 'Processing'
+        elif status == 'Success':
+            return body['file_id'], "Finished"
+        elif status == 'Fail':
+            return "", "Fail"
+        else:
+            return "", "Unknown"
+
+    @telemetry.instrument("hailuo.download")
+    def fetch(self, file_id: str, output_file_name: str = None, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Stream the finished video to a unique file (or output_file_name) and return its path.
+        """
+        print("---------------Video generated successfully, downloading now---------------")
+        response = self.request("GET", f"{self.base_url}/files/retrieve",
+                                headers=self._headers(), params={"file_id": file_id})
+        print(response.text)
+
+        download_url = response.json()['file']['download_url']
+        print("Video download link：" + download_url)
+
+        if output_file_name is None:
+            output_file_name = f"output/hailuo-{uuid.uuid4().hex}.mp4"
+        output_path = os.path.abspath(output_file_name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+        try:
+            with self.request("GET", download_url, stream=True) as download, open(tmp_path, "wb") as f:
+                for chunk in download.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        print("The video has been downloaded in："+output_path)
+        return output_path
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_hailuo_client(api_key=None):
+    """
+    Return the shared client for this API key so connections are reused across jobs.
+    """
+    key = api_key or os.environ.get("MINIMAX_API_KEY", "")
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = HailuoClient(api_key=key)
+        return _clients[key]
+
+
+def set_hailuo_client(client, api_key=None):
+    """
+    Install a client (e.g. one built on a mock adapter) as the shared instance.
+    """
+    with _clients_lock:
+        _clients[api_key or os.environ.get("MINIMAX_API_KEY", "")] = client
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from telemetry import telemetry
+
+
+class Backoff:
+    """
+    Adaptive polling delay: start short, grow geometrically up to a ceiling.
+    Remote jobs that finish quickly are noticed quickly, long ones are polled rarely.
+    """
+
+    def __init__(self, initial=2.0, factor=1.5, maximum=30.0):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.delay = initial
+
+    async def sleep(self):
+        await asyncio.sleep(self.delay)
+        self.delay = min(self.delay * self.factor, self.maximum)
+
+    def reset(self):
+        self.delay = self.initial
+
+
+class Job:
+    def __init__(self, job_id, model_id, prompt):
+        self.id = job_id
+        self.model_id = model_id
+        self.prompt = prompt
+        self.status = "queued"
+        self.detail = ""
+        # Fraction complete (0-1) when the backend reports it, e.g. Wan denoising steps
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.future = None
+
+    def update(self, status, detail="", progress=None):
+        self.status = status
+        self.detail = detail
+        self.progress = progress
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "model_id": self.model_id,
+            "status": self.status,
+            "detail": self.detail,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "elapsed_sec": round((self.finished_at or time.time()) - self.created_at, 1),
+        }
+
+
+class JobManager:
+    """
+    Runs generation jobs as coroutines on a single background event loop.
+
+    `submit` returns a job id immediately; the job coroutine receives the Job
+    object so it can report progress. Blocking SDK calls inside a job should go
+    through `asyncio.to_thread`, which uses this manager's thread pool.
+    """
+
+    def __init__(self, max_threads=64, max_finished=1000):
+        self.max_threads = max_threads
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_threads,
+                                                         thread_name_prefix="job-io"))
+            self._thread = threading.Thread(target=loop.run_forever, name="job-loop", daemon=True)
+            self._thread.start()
+            self._loop = loop
+            return loop
+
+    def submit(self, job_fn, model_id, prompt):
+        """
+        Schedule `job_fn(job)` (an async function) and return the new job id.
+        """
+        loop = self._ensure_loop()
+        job = Job(uuid.uuid4().hex, model_id, prompt)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job, job_fn), loop)
+        return job.id
+
+    async def _run(self, job, job_fn):
+        job.update("running")
+        try:
+            job.result = await job_fn(job)
+            job.update("done")
+            return job.result
+        except Exception as e:
+            job.error = str(e)
+            job.update("failed")
+            raise
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        # Caller holds self._lock; forget the oldest finished jobs beyond the cap
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job id: {job_id}")
+        return job
+
+    def status(self, job_id):
+        return self.get(job_id).to_dict()
+
+    def result(self, job_id, timeout=None):
+        """
+        Block until the job finishes and return its result (re-raises job errors).
+        """
+        return self.get(job_id).future.result(timeout=timeout)
+
+    def watch(self, job_id, interval=0.5):
+        """
+        Yield the job's status dict whenever its status, detail or progress changes,
+        checking every `interval` seconds; the last dict yielded is the finished job.
+        """
+        job = self.get(job_id)
+        last = None
+        while True:
+            finished = bool(wait([job.future], timeout=interval).done)
+            status = job.to_dict()
+            current = (status["status"], status["detail"], status["progress"])
+            if finished or current != last:
+                last = current
+                yield status
+            if finished:
+                return
+
+    def in_flight(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.finished_at is None)
+
+
+job_manager = JobManager()
+telemetry.gauge("jobs_in_flight", job_manager.in_flight, "Generation jobs submitted and not yet finished")
@@ -0,0 +1,118 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+# name -> seconds spent importing / constructing, in load order
+_timings = {}
+_proxies = []
+_timings_lock = threading.Lock()
+
+
+def _record(name, seconds):
+    with _timings_lock:
+        _timings[name] = _timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(name):
+    """
+    Record the wall time of an eagerly executed block in the cold-start report.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+class LazyProxy:
+    """
+    Stand-in for a module or object that is only built on first attribute access
+    (or call). The build time is recorded for cold_start_report().
+    """
+
+    def __init__(self, name, factory):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_target", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        with _timings_lock:
+            _proxies.append(self)
+
+    def _load(self):
+        target = object.__getattribute__(self, "_target")
+        if target is not None:
+            return target
+        with object.__getattribute__(self, "_lock"):
+            target = object.__getattribute__(self, "_target")
+            if target is None:
+                start = time.perf_counter()
+                target = object.__getattribute__(self, "_factory")()
+                _record(object.__getattribute__(self, "_name"), time.perf_counter() - start)
+                object.__setattr__(self, "_target", target)
+        return target
+
+    @property
+    def is_loaded(self):
+        return object.__getattribute__(self, "_target") is not None
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self._load(), key, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        name = object.__getattribute__(self, "_name")
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy {name} ({state})>"
+
+
+def lazy_import(module_name):
+    return LazyProxy(module_name, lambda: importlib.import_module(module_name))
+
+
+def lazy_object(name, factory):
+    return LazyProxy(name, factory)
+
+
+def prewarm(prefixes=None, background=True):
+    """
+    Load every registered lazy proxy (optionally only names starting with one of
+    `prefixes`), by default on a daemon thread so startup is not delayed.
+    """
+    with _timings_lock:
+        proxies = list(_proxies)
+    if prefixes:
+        proxies = [p for p in proxies if object.__getattribute__(p, "_name").startswith(tuple(prefixes))]
+
+    def _warm():
+        for proxy in proxies:
+            try:
+                proxy._load()
+            except Exception as e:
+                print(f"Prewarm of {object.__getattribute__(proxy, '_name')} failed: {e}")
+
+    if not background:
+        _warm()
+        return None
+    thread = threading.Thread(target=_warm, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def cold_start_report():
+    """
+    Seconds spent per subsystem so far (inclusive of nested lazy loads),
+    plus the lazy proxies that have not been loaded yet.
+    """
+    with _timings_lock:
+        report = [{"name": name, "seconds": round(seconds, 3)} for name, seconds in _timings.items()]
+        pending = sorted({object.__getattribute__(p, "_name") for p in _proxies if not p.is_loaded})
+    report.sort(key=lambda row: row["seconds"], reverse=True)
+    return {"loaded": report, "not_loaded": pending}
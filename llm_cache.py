@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from lazy import lazy_import
+from telemetry import telemetry
+
+openai_chat_types = lazy_import("openai.types.chat")
+
+
+DEFAULT_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "cache/llm_responses.sqlite3")
+# off: no caching; readwrite: serve hits and store misses; record: always call the API and
+# store the response; replay: only serve recorded responses and never touch the network
+LLM_CACHE_MODE = os.environ.get("LLM_CACHE_MODE", "readwrite")
+
+
+class LLMCacheMiss(LookupError):
+    pass
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed store of chat completion responses with an in-process LRU front tier.
+
+    Entries expire after ttl_sec and the store is trimmed to max_entries rows, dropping
+    the least recently used first.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_sec=7 * 24 * 3600, max_entries=50000, memory_entries=256):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Caller holds self._lock
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(kwargs):
+        payload = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                created_at, data = self._memory[key]
+                if now - created_at <= self.ttl_sec:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return data
+                del self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_sec:
+                if row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            data = json.loads(row[0])
+            self._remember(key, row[1], data)
+            self.hits += 1
+            return data
+
+    def put(self, key, model, data):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(data), now, now)
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+            self._remember(key, now, data)
+
+    def _remember(self, key, created_at, data):
+        # Caller holds self._lock
+        self._memory[key] = (created_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+llm_cache = LLMResponseCache()
+telemetry.gauge("llm_cache_hits", lambda: llm_cache.hits, "LLM response cache hits since start")
+telemetry.gauge("llm_cache_misses", lambda: llm_cache.misses, "LLM response cache misses since start")
+
+
+class _CachedCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def _lookup(self, kwargs):
+        owner = self._owner
+        if kwargs.get("stream"):
+            # Streamed responses are never stored, so replay cannot serve them from the cache
+            if owner.mode == "replay":
+                raise LLMCacheMiss(f"Streamed {kwargs.get('model')} requests cannot be replayed")
+            return None, None
+        if owner.mode == "off":
+            return None, None
+        # Sampled (high temperature) calls are only cached when recording for replay
+        if owner.mode == "readwrite" and kwargs.get("temperature", 1.0) > owner.max_temperature:
+            return None, None
+        key = owner.cache.make_key(kwargs)
+        if owner.mode != "record":
+            data = owner.cache.get(key)
+            if data is not None:
+                return key, openai_chat_types.ChatCompletion.model_validate(data)
+        if owner.mode == "replay":
+            raise LLMCacheMiss(f"No recorded response for {kwargs.get('model')} request {key[:12]}")
+        return key, None
+
+    def _store(self, key, kwargs, response):
+        if key is not None:
+            self._owner.cache.put(key, kwargs.get("model"), response.model_dump(mode="json"))
+
+    def create(self, **kwargs):
+        # llm.chat covers cache hits too; llm.request is only the API round trip
+        with telemetry.span("llm.chat", model=kwargs.get("model")):
+            key, cached = self._lookup(kwargs)
+            if cached is not None:
+                return cached
+            with telemetry.span("llm.request", model=kwargs.get("model")):
+                response = self._owner.client.chat.completions.create(**kwargs)
+            self._store(key, kwargs, response)
+            return response
+
+
+class _CachedAsyncCompletions(_CachedCompletions):
+    async def create(self, **kwargs):
+        with telemetry.span("llm.chat", model=kwargs.get("model")):
+            key, cached = self._lookup(kwargs)
+            if cached is not None:
+                return cached
+            with telemetry.span("llm.request", model=kwargs.get("model")):
+                response = await self._owner.client.chat.completions.create(**kwargs)
+            self._store(key, kwargs, response)
+            return response
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class CachedChatClient:
+    """
+    Drop-in wrapper for OpenAI / AsyncOpenAI exposing a cached `chat.completions.create`.
+
+    Other attributes are forwarded to the wrapped client.
+    """
+
+    def __init__(self, client, cache=llm_cache, mode=None, max_temperature=0.5, is_async=False):
+        self.client = client
+        self.cache = cache
+        self.mode = mode or LLM_CACHE_MODE
+        self.max_temperature = max_temperature
+        completions = _CachedAsyncCompletions(self) if is_async else _CachedCompletions(self)
+        self.chat = _Chat(completions)
+
+    def __getattr__(self, item):
+        return getattr(self.client, item)
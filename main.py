@@ -1,46 +1,209 @@
-from typing import Dict
-
-import gradio as gr
-import json
+import time
 
-from cinematic_planning import build_scene_sequence
-from generation import generate_video
-from prompt_template_control import generate_video_prompt_with_template
-from storyboard import generate_multiple_storyboards
+_startup_begin = time.perf_counter()
 
+from contextlib import nullcontext
+from typing import Dict
 
-def save_storyboard_choice(choice: Dict[str, str]):
-    # Save the full dictionary as JSON (append mode)
-    with open("selected_storyboards.json", "a") as f:
-        f.write(json.dumps(choice) + "\n")
-    return f"✅ Saved your selection to selected_storyboards.json:\n\n{json.dumps(choice, indent=2)}"
+import json
+import os
+
+from lazy import cold_start_report, prewarm, timed
+
+with timed("import gradio"):
+    import gradio as gr
+
+# Heavy SDKs and models behind these modules load lazily on first use
+with timed("import app modules"):
+    from cinematic_planning import iter_scene_sequence
+    from generation import (BACKEND_CONCURRENCY, DEFAULT_WAN_PRESET, WAN_PRESETS, backend_slot, get_video_job,
+                            submit_refine_job, submit_video_job, watch_video_job)
+    from llm_cache import llm_cache
+    from pipeline_registry import WAN_MODEL_IDS, registry
+    from result_cache import video_cache
+    from selection_store import selection_store
+    from prompt_template_control import generate_video_prompt_with_template
+    from storyboard import iter_multiple_storyboards
+    from telemetry import DEFAULT_METRICS_PORT, telemetry
+    from video_assembly import stitch_scene_sequence
+    from worker_pool import PRIORITY_INTERACTIVE, WorkerPool, job_broker
+
+# Events running at once per handler unless set below; remote video handlers are further
+# limited per backend by generation.backend_slot, Wan renders by the pipeline lock
+UI_CONCURRENCY = int(os.environ.get("UI_CONCURRENCY", "16"))
+# inprocess: generate inside the UI process; pool: only enqueue on the job broker and
+# stream results, generation runs in worker_pool.py processes
+WORKER_MODE = os.environ.get("WORKER_MODE", "inprocess")
+# Workers the UI starts itself in pool mode; 0 when they run separately (python worker_pool.py)
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "2"))
+
+
+def save_storyboard_choice(choice: Dict[str, str], narrative: str = None):
+    # Stored in the SQLite selection store (see selection_store.py)
+    selection_id = selection_store.record_selection(choice, narrative)
+    return f"✅ Saved your selection (#{selection_id}) to {selection_store.path}:\n\n{json.dumps(choice, indent=2)}"
+
+
+def format_job_status(status):
+    text = f"{status['model_id']}: {status['status']}"
+    if status["detail"]:
+        text += f" ({status['detail']})"
+    return text + f" - {status['elapsed_sec']}s"
+
+
+def request_user(request):
+    # Fair-share key for the worker pool: the logged-in user, else the browser session
+    if request is None:
+        return None
+    return getattr(request, "username", None) or getattr(request, "session_hash", None)
+
+
+def stream_job(job_id, watch=watch_video_job):
+    """
+    Yield (video_path, status_text, timings) while the job runs; video_path is only
+    set on the final update. Failed jobs are raised as a gr.Error.
+    """
+    for status in watch(job_id):
+        yield None, format_job_status(status), status["timings"]
+    if status["status"] == "failed":
+        raise gr.Error(f"Generation failed: {status['error']}")
+    yield status["result"], format_job_status(status), status["timings"]
+
+
+def stream_video_generation(prompt, model, negative=None, preset=DEFAULT_WAN_PRESET, seed=None,
+                            request: gr.Request = None):
+    # Shows the wait for a backend slot, Wan denoising steps and remote poll status as they happen
+    if WORKER_MODE == "pool":
+        job_id = job_broker.submit_video_job(prompt, model, negative, preset, seed, user=request_user(request),
+                                             priority=PRIORITY_INTERACTIVE)
+        yield from stream_job(job_id, watch=job_broker.watch)
+        return
+    # Wan jobs queue on the pipeline lock, which only covers the denoising call, so the
+    # next render starts while this clip is still being encoded. Remote backends hold a
+    # slot while the provider works on the job.
+    remote = model != "Wan2.1"
+    if remote:
+        yield None, f"{model}: waiting for a free slot", None
+    with backend_slot(model) if remote else nullcontext():
+        try:
+            job_id = submit_video_job(prompt, model, negative, preset, seed)
+        except ValueError as e:
+            raise gr.Error(str(e))
+        yield from stream_job(job_id)
+
+
+def stream_refine(video_path, prompt, negative, seed, request: gr.Request = None):
+    # Draft-then-upscale: re-render the current draft at the final preset
+    if WORKER_MODE == "pool":
+        job_id = job_broker.submit_refine_job(video_path, prompt, negative, seed=seed, user=request_user(request),
+                                              priority=PRIORITY_INTERACTIVE)
+        yield from stream_job(job_id, watch=job_broker.watch)
+        return
+    # Queues on the Wan pipeline lock like any Wan render (see stream_video_generation)
+    yield from stream_job(submit_refine_job(video_path, prompt, negative, seed=seed))
+
+
+def submit_job(prompt, model, negative, preset, seed, request: gr.Request = None):
+    # Non-blocking variant: returns a job id, check_job polls it
+    if WORKER_MODE == "pool":
+        return job_broker.submit_video_job(prompt, model, negative, preset, seed, user=request_user(request),
+                                           priority=PRIORITY_INTERACTIVE)
+    return submit_video_job(prompt, model, negative, preset, seed)
+
+
+def check_job(job_id):
+    job_id = job_id.strip()
+    try:
+        status = job_broker.status(job_id) if WORKER_MODE == "pool" else get_video_job(job_id)
+    except KeyError as e:
+        raise gr.Error(str(e))
+    return status, status["result"] if status["status"] == "done" else None
+
+
+def stream_storyboards(narrative):
+    # Each storyboard is shown as soon as its version finishes
+    cards = {}
+    for i, storyboard in iter_multiple_storyboards(narrative):
+        cards[i] = storyboard
+        yield gr.update(choices=[cards[k] for k in sorted(cards)])
+    selection_store.record_storyboards(narrative, [cards[k] for k in sorted(cards)])
+
+
+def format_scene_sequence(scene_sequence):
+    result_text = ""
+    for i, step in enumerate(scene_sequence):
+        result_text += f"\nKeyframe {i + 1}:\n"
+        if step is None:
+            result_text += "Generating...\n"
+            continue
+        result_text += f"Transition: {step['transition_text']}\n"
+        if step.get("error"):
+            result_text += f"Failed: {step['error']}\n"
+        else:
+            result_text += f"Video Path: {step['video_path']}\n"
+    return result_text
 
 
 # Connect button
-def run_pseudo_video_workflow(scene, shot_type, emotion, model_choice, num_keyframes):
+def run_pseudo_video_workflow(scene, shot_type, emotion, model_choice, num_keyframes, crossfade_sec=0.0,
+                              request: gr.Request = None):
     # Build storyboard dict
     storyboard = {
         "scene": scene,
         "shot_type": shot_type,
         "emotion": emotion
     }
-
-    # Call your iterative builder
-    scene_sequence = build_scene_sequence(
-        storyboard, model_choice, num_keyframes=num_keyframes
-    )
-
-    # Format result as text
-    result_text = ""
-    for i, step in enumerate(scene_sequence):
-        result_text += f"\nKeyframe {i + 1}:\n"
-        result_text += f"Transition: {step['transition_text']}\n"
-        result_text += f"Video Path: {step['video_path']}\n"
-
-    return result_text
+    num_keyframes = int(num_keyframes)
+
+    # Generate all keyframes concurrently and stream each clip as it finishes
+    scene_sequence = [None] * num_keyframes
+    latest_clip = None
+    yield format_scene_sequence(scene_sequence), None, None
+    broker = job_broker if WORKER_MODE == "pool" else None
+    for i, step in iter_scene_sequence(storyboard, model_choice, num_keyframes=num_keyframes, broker=broker,
+                                       user=request_user(request), priority=PRIORITY_INTERACTIVE):
+        scene_sequence[i] = step
+        latest_clip = step.get("video_path") or latest_clip
+        yield format_scene_sequence(scene_sequence), latest_clip, None
+
+    # Join the keyframe clips into one continuous video
+    result_text = format_scene_sequence(scene_sequence)
+    try:
+        stitched_path = stitch_scene_sequence(scene_sequence, crossfade_sec=crossfade_sec)
+    except Exception as e:
+        yield result_text + f"\nStitching failed: {e}\n", latest_clip, None
+        return
+    if stitched_path:
+        result_text += f"\nStitched Video: {stitched_path}\n"
+    yield result_text, latest_clip, stitched_path
 
 
 if __name__ == "__main__":
+    # Preload Wan weights in the background, e.g. WAN_WARMUP_MODELS="1.3B,14B" (empty to disable)
+    warmup_models = [WAN_MODEL_IDS[name.strip()] for name in os.environ.get("WAN_WARMUP_MODELS", "1.3B").split(",")
+                     if name.strip()]
+    # In pool mode the pipelines live in the worker processes instead
+    if warmup_models and WORKER_MODE != "pool":
+        registry.warmup_in_background(warmup_models)
+
+    # PREWARM=1 loads every lazy SDK/client on a background thread after startup
+    if os.environ.get("PREWARM", "0") == "1":
+        prewarm()
+
+    # Prometheus scrape endpoint next to the UI (METRICS_PORT=0 disables it)
+    if DEFAULT_METRICS_PORT:
+        telemetry.serve(DEFAULT_METRICS_PORT)
+
+    # Worker tier for WORKER_MODE=pool; with WORKER_POOL_SIZE=0 it is started separately
+    worker_pool = None
+    if WORKER_MODE == "pool":
+        telemetry.gauge("broker_jobs", job_broker.counts, "Worker pool jobs per status", label="status")
+        if WORKER_POOL_SIZE:
+            worker_pool = WorkerPool(WORKER_POOL_SIZE, job_broker.path).start()
+
+    # One-off (and incremental) migration of selections saved by older versions
+    selection_store.import_legacy_json("selected_storyboards.json")
+
     with gr.Blocks() as demo:
         gr.Markdown("# 🎥 Video Generator")
 
@@ -53,14 +216,71 @@ if __name__ == "__main__":
                     choices=["SkyReels-V2", "Wan2.1", "Veo-2", "T2V-01-Director"],
                     label="Choose the video generation model"
                 )
+                wan_preset = gr.Radio(
+                    choices=list(WAN_PRESETS),
+                    value=DEFAULT_WAN_PRESET,
+                    label="Wan2.1 quality preset (draft renders in a fraction of the time)"
+                )
+                wan_seed = gr.Number(label="Seed (optional: Wan2.1 Only)", value=None, precision=0)
                 generate_btn = gr.Button("Generate Video")
             with gr.Column():
                 video_output = gr.Video(label="Generated Video")
-
+                refine_btn = gr.Button("Refine Wan Draft to Final (720p)")
+                progress_output = gr.Textbox(label="Progress", interactive=False)
+                timing_output = gr.JSON(label="Timing breakdown (seconds per stage)")
+
+        with gr.Accordion("Model and Cache Stats", open=False):
+            registry_stats = gr.JSON(label="Load time and resident size")
+            refresh_stats_btn = gr.Button("Refresh")
+            refresh_stats_btn.click(registry.stats, inputs=None, outputs=registry_stats)
+            cache_stats = gr.JSON(label="Video cache hit/miss counters")
+            refresh_stats_btn.click(video_cache.stats, inputs=None, outputs=cache_stats)
+            llm_cache_stats = gr.JSON(label="LLM response cache hit/miss counters")
+            refresh_stats_btn.click(llm_cache.stats, inputs=None, outputs=llm_cache_stats)
+            startup_stats = gr.JSON(label="Cold-start timing (seconds per subsystem)")
+            refresh_stats_btn.click(cold_start_report, inputs=None, outputs=startup_stats)
+            stage_stats = gr.JSON(label="Time per pipeline stage since start")
+            refresh_stats_btn.click(telemetry.summary, inputs=None, outputs=stage_stats)
+            selection_stats = gr.JSON(label="Saved storyboard selections per version")
+            refresh_stats_btn.click(selection_store.version_counts, inputs=None, outputs=selection_stats)
+            if worker_pool is not None:
+                pool_stats = gr.JSON(label="Worker processes and queued jobs")
+                refresh_stats_btn.click(worker_pool.stats, inputs=None, outputs=pool_stats)
+
+        # Streaming handlers: status and timings update while the job runs
         generate_btn.click(
-            generate_video,
-            inputs=[video_prompt, model_choice, negative_prompt],
-            outputs=video_output
+            stream_video_generation,
+            inputs=[video_prompt, model_choice, negative_prompt, wan_preset, wan_seed],
+            outputs=[video_output, progress_output, timing_output],
+            concurrency_id="generate_video",
+            concurrency_limit=sum(BACKEND_CONCURRENCY.values())
+        )
+
+        refine_btn.click(
+            stream_refine,
+            inputs=[video_output, video_prompt, negative_prompt, wan_seed],
+            outputs=[video_output, progress_output, timing_output],
+            concurrency_limit=BACKEND_CONCURRENCY["Wan2.1"]
+        )
+
+        # Non-blocking variant: submit returns a job id, status can be polled later
+        with gr.Row():
+            submit_job_btn = gr.Button("Submit as Background Job")
+            job_id_box = gr.Textbox(label="Job ID")
+            check_job_btn = gr.Button("Check Job Status")
+        job_status_output = gr.JSON(label="Job Status")
+
+        submit_job_btn.click(
+            submit_job,
+            inputs=[video_prompt, model_choice, negative_prompt, wan_preset, wan_seed],
+            outputs=job_id_box,
+            api_name="submit_job"
+        )
+        check_job_btn.click(
+            check_job,
+            inputs=job_id_box,
+            outputs=[job_status_output, video_output],
+            api_name="job_status"
         )
 
         # Divider
@@ -78,13 +298,8 @@ if __name__ == "__main__":
         save_output = gr.Textbox(label="Save Output", interactive=False)
 
         # Generate the storyboards
-        def update_storyboards(narrative):
-            cards = generate_multiple_storyboards(narrative)
-            return gr.update(choices=cards)
-
-
         generate_storyboards_btn.click(
-            update_storyboards,
+            stream_storyboards,
             inputs=narrative_input,
             outputs=storyboards_output
         )
@@ -92,7 +307,7 @@ if __name__ == "__main__":
         # Save the choice
         save_choice_btn.click(
             save_storyboard_choice,
-            inputs=storyboards_output,
+            inputs=[storyboards_output, narrative_input],
             outputs=save_output
         )
 
@@ -121,6 +336,8 @@ if __name__ == "__main__":
         # Generate video
         generate_video_btn = gr.Button("Generate Video")
         video_output = gr.Video(label="Generated Video")
+        template_progress_output = gr.Textbox(label="Progress", interactive=False)
+        template_timing_output = gr.JSON(label="Timing breakdown (seconds per stage)")
 
         # Connect callbacks
         generate_prompt_btn.click(
@@ -130,9 +347,11 @@ if __name__ == "__main__":
         )
 
         generate_video_btn.click(
-            generate_video,
+            stream_video_generation,
             inputs=[final_prompt_output, model_choice, negative_prompt],
-            outputs=video_output
+            outputs=[video_output, template_progress_output, template_timing_output],
+            concurrency_id="generate_video",
+            concurrency_limit=sum(BACKEND_CONCURRENCY.values())
         )
 
         gr.Markdown("# 🎞️ Pseudo Video Workflow (Storyboard → Scene Builder)")
@@ -148,10 +367,14 @@ if __name__ == "__main__":
         )
 
         num_keyframes_input = gr.Slider(minimum=1, maximum=20, value=12, label="Number of Keyframes")
+        crossfade_input = gr.Slider(minimum=0, maximum=1.5, value=0, step=0.1,
+                                    label="Crossfade at transitions (seconds, 0 = stream copy)")
 
         run_pseudo_video_btn = gr.Button("Build Pseudo Video Workflow")
 
         pseudo_output = gr.Textbox(label="Workflow Result", lines=10)
+        pseudo_keyframe_output = gr.Video(label="Latest Keyframe")
+        pseudo_video_output = gr.Video(label="Stitched Scene Sequence")
 
         # Hook to Gradio button
         run_pseudo_video_btn.click(
@@ -161,9 +384,16 @@ if __name__ == "__main__":
                 pseudo_shot_input,
                 pseudo_emotion_input,
                 pseudo_model_choice,
-                num_keyframes_input
+                num_keyframes_input,
+                crossfade_input
             ],
-            outputs=pseudo_output
+            outputs=[pseudo_output, pseudo_keyframe_output, pseudo_video_output],
+            concurrency_limit=max(BACKEND_CONCURRENCY.values())
         )
 
+    startup_sec = time.perf_counter() - _startup_begin
+    print(f"App ready in {startup_sec:.2f}s")
+    print(json.dumps(cold_start_report(), indent=2))
+    # Generator handlers stream through the queue
+    demo.queue(default_concurrency_limit=UI_CONCURRENCY)
     demo.launch()
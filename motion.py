@@ -0,0 +1,156 @@
+import time
+
+import cv2
+import numpy as np
+
+
+def flow_magnitude(flow):
+    """
+    Mean per-pixel displacement of a dense HxWx2 flow field.
+    """
+    return float(np.hypot(flow[..., 0], flow[..., 1]).mean())
+
+
+class MotionEstimator:
+    """
+    Estimates mean motion (pixels) between two consecutive grayscale frames.
+    """
+
+    name = "motion_estimator"
+    # Displacement estimators are rescaled to full-resolution pixels per frame
+    is_displacement = True
+
+    def estimate(self, prev_gray, gray):
+        raise NotImplementedError
+
+
+class FarnebackEstimator(MotionEstimator):
+    name = "farneback"
+
+    def __init__(self, pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5, poly_sigma=1.2):
+        self.params = (pyr_scale, levels, winsize, iterations, poly_n, poly_sigma, 0)
+
+    def estimate(self, prev_gray, gray):
+        flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, *self.params)
+        return flow_magnitude(flow)
+
+
+class DISEstimator(MotionEstimator):
+    """
+    OpenCV's Dense Inverse Search flow; the ultrafast/fast presets are several
+    times cheaper than Farneback on the same frames.
+    """
+
+    name = "dis"
+
+    def __init__(self, preset=cv2.DISOPTICAL_FLOW_PRESET_FAST):
+        self.dis = cv2.DISOpticalFlow_create(preset)
+
+    def estimate(self, prev_gray, gray):
+        return flow_magnitude(self.dis.calc(prev_gray, gray, None))
+
+
+class LucasKanadeEstimator(MotionEstimator):
+    """
+    Sparse pyramidal Lucas-Kanade on tracked Shi-Tomasi corners. Corners are carried
+    from frame to frame and re-detected when fewer than half survive.
+    """
+
+    name = "lk"
+
+    def __init__(self, max_corners=300, quality_level=0.01, min_distance=7, win_size=(15, 15), max_level=2):
+        self.max_corners = max_corners
+        self.quality_level = quality_level
+        self.min_distance = min_distance
+        self.lk_params = {"winSize": win_size, "maxLevel": max_level,
+                          "criteria": (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)}
+        self.points = None
+
+    def _detect(self, gray):
+        return cv2.goodFeaturesToTrack(gray, self.max_corners, self.quality_level, self.min_distance)
+
+    def estimate(self, prev_gray, gray):
+        if self.points is None or len(self.points) < self.max_corners // 2:
+            self.points = self._detect(prev_gray)
+        if self.points is None:
+            return 0.0
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, self.points, None, **self.lk_params)
+        good = status.ravel() == 1
+        if not good.any():
+            self.points = None
+            return 0.0
+        displacement = (next_points[good] - self.points[good]).reshape(-1, 2)
+        self.points = next_points[good].reshape(-1, 1, 2)
+        return float(np.hypot(displacement[:, 0], displacement[:, 1]).mean())
+
+
+class FrameDifferenceEstimator(MotionEstimator):
+    """
+    Mean absolute intensity change. Not a displacement, so its scale differs from the
+    flow-based estimators; useful as a near-free "is anything moving" signal.
+    """
+
+    name = "diff"
+    is_displacement = False
+
+    def estimate(self, prev_gray, gray):
+        return float(cv2.absdiff(prev_gray, gray).mean())
+
+
+MOTION_ESTIMATORS = {
+    FarnebackEstimator.name: FarnebackEstimator,
+    DISEstimator.name: DISEstimator,
+    LucasKanadeEstimator.name: LucasKanadeEstimator,
+    FrameDifferenceEstimator.name: FrameDifferenceEstimator,
+}
+
+
+def make_estimator(estimator):
+    if isinstance(estimator, MotionEstimator):
+        return estimator
+    return MOTION_ESTIMATORS[estimator]()
+
+
+def benchmark_motion_estimators(video_paths, estimators=tuple(MOTION_ESTIMATORS), configs=((1, None), (2, 360))):
+    """
+    Time each estimator at each (stride, max_side) config and compare its score with
+    the reference full-resolution, every-frame Farneback score.
+
+    Returns one row per video/estimator/config with seconds, speedup and relative error.
+    """
+    from video_metrics import MotionConsumer, analyze_video
+
+    rows = []
+    for video_path in video_paths:
+        start = time.perf_counter()
+        reference = analyze_video(video_path, [MotionConsumer("farneback")])[MotionConsumer.name]
+        reference_sec = time.perf_counter() - start
+
+        for estimator in estimators:
+            for stride, max_side in configs:
+                start = time.perf_counter()
+                score = analyze_video(video_path, [MotionConsumer(estimator)], stride, max_side)[MotionConsumer.name]
+                seconds = time.perf_counter() - start
+                rows.append({
+                    "video": video_path,
+                    "estimator": estimator,
+                    "stride": stride,
+                    "max_side": max_side,
+                    "score": round(float(score), 4),
+                    "reference_score": round(float(reference), 4),
+                    "relative_error": round(abs(score - reference) / reference, 4) if reference else None,
+                    "seconds": round(seconds, 3),
+                    "speedup": round(reference_sec / seconds, 2) if seconds else None,
+                })
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark motion estimators against full-res Farneback")
+    parser.add_argument("videos", nargs="+")
+    args = parser.parse_args()
+    for row in benchmark_motion_estimators(args.videos):
+        print(json.dumps(row))
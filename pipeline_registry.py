@@ -0,0 +1,353 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from lazy import lazy_import
+from telemetry import telemetry
+
+# torch/diffusers are only imported when the first pipeline is loaded
+torch = lazy_import("torch")
+diffusers = lazy_import("diffusers")
+
+
+# Available models: Wan-AI/Wan2.1-T2V-14B-Diffusers, Wan-AI/Wan2.1-T2V-1.3B-Diffusers
+WAN_MODEL_IDS = {
+    "1.3B": "Wan-AI/Wan2.1-T2V-1.3B-Diffusers",
+    "14B": "Wan-AI/Wan2.1-T2V-14B-Diffusers",
+}
+DEFAULT_WAN_MODEL_ID = WAN_MODEL_IDS["1.3B"]
+
+# Total resident size allowed for cached pipelines (GB), override with WAN_MEMORY_BUDGET_GB
+DEFAULT_MEMORY_BUDGET_GB = float(os.environ.get("WAN_MEMORY_BUDGET_GB", "48"))
+
+# CPU inference profiles, applied once when a pipeline is loaded (see apply_inference_profile).
+# threads: intra-op threads (0 = all cores), interop_threads: inter-op pool size,
+# vae_tiling: decode latents tile by tile to bound peak memory, compile: torch.compile the
+# transformer, step_cache: FirstBlockCache threshold for reusing the transformer's residual
+# across adjacent timesteps (TeaCache-style; 0 disables, higher skips more steps)
+WAN_INFERENCE_PROFILES = {
+    "baseline": {"threads": None, "interop_threads": None, "vae_tiling": False, "compile": False,
+                 "step_cache": 0.0},
+    "fast": {"threads": 0, "interop_threads": 1, "vae_tiling": True, "compile": False, "step_cache": 0.0},
+    "compiled": {"threads": 0, "interop_threads": 1, "vae_tiling": True, "compile": True, "step_cache": 0.0},
+    "turbo": {"threads": 0, "interop_threads": 1, "vae_tiling": True, "compile": True, "step_cache": 0.05},
+}
+DEFAULT_WAN_INFERENCE_PROFILE = os.environ.get("WAN_INFERENCE_PROFILE", "fast")
+# Persistent inductor cache so compiled kernels survive restarts
+WAN_COMPILE_CACHE_DIR = os.environ.get("WAN_COMPILE_CACHE_DIR", "cache/torchinductor")
+
+
+def _module_nbytes(module):
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def pipeline_nbytes(pipe):
+    """
+    Sum the parameter and buffer sizes of every torch module in the pipeline.
+    """
+    total = 0
+    for component in pipe.components.values():
+        if isinstance(component, torch.nn.Module):
+            total += _module_nbytes(component)
+    return total
+
+
+def configure_torch_threads(threads=0, interop_threads=None):
+    """
+    Set torch's intra-op (0 = one per core) and inter-op thread counts. The inter-op
+    pool can only be sized before torch runs parallel work, later calls keep the old size.
+    """
+    if threads is not None:
+        torch.set_num_threads(threads or os.cpu_count() or 1)
+    if interop_threads is not None and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Keeping {torch.get_num_interop_threads()} inter-op threads: {e}")
+
+
+def apply_inference_profile(pipe, profile=DEFAULT_WAN_INFERENCE_PROFILE):
+    """
+    Apply a WAN_INFERENCE_PROFILES entry (or a dict of the same keys) to a loaded
+    pipeline. Optimisations the installed diffusers/torch lack are skipped with a
+    message. Returns the settings that were actually applied.
+    """
+    settings = dict(WAN_INFERENCE_PROFILES[profile]) if isinstance(profile, str) else dict(profile)
+    configure_torch_threads(settings["threads"], settings["interop_threads"])
+
+    if settings["vae_tiling"]:
+        try:
+            pipe.vae.enable_tiling()
+        except (AttributeError, NotImplementedError) as e:
+            print(f"VAE tiling unavailable: {e}")
+            settings["vae_tiling"] = False
+
+    if settings["step_cache"]:
+        try:
+            from diffusers.hooks import FirstBlockCacheConfig
+
+            # Older WanPipelines share one cache between the cond and uncond passes
+            if not hasattr(pipe.transformer, "cache_context"):
+                raise AttributeError("this diffusers release has no per-branch cache contexts")
+            pipe.transformer.enable_cache(FirstBlockCacheConfig(threshold=settings["step_cache"]))
+        except (ImportError, AttributeError, ValueError) as e:
+            print(f"Step caching unavailable, running every step: {e}")
+            settings["step_cache"] = 0.0
+
+    if settings["compile"]:
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(WAN_COMPILE_CACHE_DIR))
+        os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+        # Compiled in place so the module keeps its type and config for the pipeline
+        pipe.transformer.compile(dynamic=False)
+    return settings
+
+
+# Text-encoder outputs kept per pipeline; about 1 MB each, since padding is not stored
+WAN_EMBEDDING_CACHE_ENTRIES = int(os.environ.get("WAN_EMBEDDING_CACHE_ENTRIES", "256"))
+
+
+def _trim_padding(embeds):
+    # Wan zero-pads every prompt to max_sequence_length; keep only the real token rows
+    used = (embeds != 0).any(dim=-1).nonzero()
+    return embeds[:int(used[-1]) + 1 if len(used) else 0].detach().clone()
+
+
+class PromptEmbeddingCache:
+    """
+    UMT5 embeddings of one Wan pipeline's text encoder, keyed by exact text (LRU).
+
+    Keyframes of a sequence share the negative prompt, and re-renders repeat prompts,
+    so each distinct text is encoded once. UMT5 is a bidirectional encoder: every
+    token's embedding depends on the whole text, so a shared prefix has no reusable
+    embedding of its own and only whole texts are cached. The zero padding is
+    restored on the way out, so cached embeddings equal freshly encoded ones.
+    """
+
+    def __init__(self, max_entries=WAN_EMBEDDING_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, pipe, texts, max_sequence_length=512):
+        """
+        Embeddings [len(texts), max_sequence_length, dim] for texts, running the text
+        encoder only on texts that are not cached.
+        """
+        rows = {}
+        with self._lock:
+            for text in texts:
+                key = (text, max_sequence_length)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    rows[text] = self._entries[key]
+                    self.hits += 1
+        missing = [text for text in dict.fromkeys(texts) if text not in rows]
+        if missing:
+            # encode_prompt is not no_grad itself; without this every cached row would keep
+            # the text encoder's autograd graph alive
+            with torch.inference_mode():
+                embeds, _ = pipe.encode_prompt(prompt=missing, do_classifier_free_guidance=False,
+                                               max_sequence_length=max_sequence_length)
+            with self._lock:
+                for text, row in zip(missing, embeds):
+                    rows[text] = self._entries[(text, max_sequence_length)] = _trim_padding(row)
+                    self.misses += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        padded = []
+        for text in texts:
+            row = rows[text]
+            padding = row.new_zeros(max_sequence_length - row.shape[0], row.shape[1])
+            padded.append(torch.cat([row, padding]))
+        return torch.stack(padded)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class PipelineEntry:
+    def __init__(self, key, pipe, load_time_sec, nbytes, profile=None):
+        self.key = key
+        self.pipe = pipe
+        self.load_time_sec = load_time_sec
+        self.nbytes = nbytes
+        self.profile = profile
+        # Wan renders are not re-entrant, so callers hold this while denoising
+        self.lock = threading.Lock()
+        self.schedulers = {}
+        self.embeddings = PromptEmbeddingCache()
+        self._video_to_video = None
+
+    def set_flow_shift(self, flow_shift):
+        """
+        Swap in a UniPC scheduler with the given flow_shift (caller holds self.lock).
+        """
+        scheduler = self.schedulers.get(flow_shift)
+        if scheduler is None:
+            scheduler = diffusers.UniPCMultistepScheduler.from_config(self.pipe.scheduler.config, flow_shift=flow_shift)
+            self.schedulers[flow_shift] = scheduler
+        self.pipe.scheduler = scheduler
+        return scheduler
+
+    @property
+    def video_to_video(self):
+        """
+        WanVideoToVideoPipeline sharing this pipeline's weights (no extra memory).
+        """
+        if self._video_to_video is None:
+            self._video_to_video = diffusers.WanVideoToVideoPipeline.from_pipe(self.pipe)
+        self._video_to_video.scheduler = self.pipe.scheduler
+        return self._video_to_video
+
+
+class PipelineRegistry:
+    """
+    Process-wide cache of loaded Wan2.1 pipelines keyed by (model_id, dtype, device).
+
+    Each model is loaded once and kept resident; when the total size exceeds the
+    memory budget the least recently used pipelines are evicted.
+    """
+
+    def __init__(self, memory_budget_gb=DEFAULT_MEMORY_BUDGET_GB, profile=DEFAULT_WAN_INFERENCE_PROFILE):
+        self.memory_budget_bytes = int(memory_budget_gb * 1024 ** 3)
+        self.profile = profile
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_id, dtype="bfloat16", device="cpu"):
+        # Accept torch dtypes or their names ("bfloat16" and torch.bfloat16 share a key)
+        return model_id, str(dtype).replace("torch.", ""), str(device)
+
+    def get(self, model_id=DEFAULT_WAN_MODEL_ID, dtype="bfloat16", device="cpu"):
+        """
+        Return the PipelineEntry for the model, loading it on first use.
+        Concurrent callers asking for the same key share a single load.
+        """
+        key = self.make_key(model_id, dtype, device)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            event = self._loading.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._loading[key] = event
+
+        if not owner:
+            event.wait()
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            # The loading thread failed, retry the load ourselves
+            return self.get(model_id, dtype, device)
+
+        try:
+            entry = self._load(key, model_id, dtype, device)
+            with self._lock:
+                self._entries[key] = entry
+                self._evict(keep=key)
+            return entry
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def _load(self, key, model_id, dtype, device):
+        print(f"Loading Wan pipeline {model_id} ({dtype}, {device})...")
+        start = time.perf_counter()
+        if isinstance(dtype, str):
+            dtype = getattr(torch, dtype)
+        vae = diffusers.AutoencoderKLWan.from_pretrained(model_id, subfolder="vae", torch_dtype=torch.float32)
+        flow_shift = 5.0  # 5.0 for 720P, 3.0 for 480P
+        scheduler = diffusers.UniPCMultistepScheduler(prediction_type='flow_prediction', use_flow_sigmas=True,
+                                                      num_train_timesteps=1000, flow_shift=flow_shift)
+        pipe = diffusers.WanPipeline.from_pretrained(model_id, vae=vae, torch_dtype=dtype)
+        pipe.scheduler = scheduler
+        pipe.to(device)
+        profile = apply_inference_profile(pipe, self.profile)
+        load_time = time.perf_counter() - start
+        nbytes = pipeline_nbytes(pipe)
+        print(f"Loaded {model_id} in {load_time:.1f}s, resident size {nbytes / 1024 ** 3:.2f} GB")
+        return PipelineEntry(key, pipe, load_time, nbytes, profile)
+
+    def register(self, model_id, pipe, dtype="bfloat16", device="cpu", profile=None):
+        """
+        Insert an already constructed pipeline (e.g. a small test pipeline), optionally
+        applying an inference profile to it.
+        """
+        key = self.make_key(model_id, dtype, device)
+        if profile is not None:
+            profile = apply_inference_profile(pipe, profile)
+        entry = PipelineEntry(key, pipe, 0.0, pipeline_nbytes(pipe), profile)
+        with self._lock:
+            self._entries[key] = entry
+            self._evict(keep=key)
+        return entry
+
+    def _evict(self, keep):
+        # Caller holds self._lock
+        total = sum(entry.nbytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.memory_budget_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self._entries[key]
+            # Never drop a pipeline that is in the middle of a render
+            if entry.lock.locked():
+                continue
+            del self._entries[key]
+            total -= entry.nbytes
+            print(f"Evicted Wan pipeline {key[0]} ({entry.nbytes / 1024 ** 3:.2f} GB)")
+
+    def set_memory_budget(self, memory_budget_gb):
+        with self._lock:
+            self.memory_budget_bytes = int(memory_budget_gb * 1024 ** 3)
+            self._evict(keep=None)
+
+    def warmup_in_background(self, model_ids=(DEFAULT_WAN_MODEL_ID,), dtype="bfloat16", device="cpu"):
+        """
+        Load the given models on a daemon thread so the first request does not pay for it.
+        """
+        def _warmup():
+            for model_id in model_ids:
+                try:
+                    self.get(model_id, dtype, device)
+                except Exception as e:
+                    print(f"Warmup of {model_id} failed: {e}")
+
+        thread = threading.Thread(target=_warmup, name="wan-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "model_id": entry.key[0],
+                    "dtype": entry.key[1],
+                    "device": entry.key[2],
+                    "load_time_sec": round(entry.load_time_sec, 2),
+                    "resident_gb": round(entry.nbytes / 1024 ** 3, 3),
+                    "profile": entry.profile,
+                    "prompt_embeddings": entry.embeddings.stats(),
+                }
+                for entry in self._entries.values()
+            ]
+
+
+registry = PipelineRegistry()
+telemetry.gauge("wan_pipelines_resident_gb", lambda: sum(row["resident_gb"] for row in registry.stats()),
+                "Resident size of cached Wan pipelines")
@@ -1,13 +1,19 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from lazy import lazy_import, lazy_object
+from llm_cache import CachedChatClient
+from telemetry import telemetry
+
+openai = lazy_import("openai")
+
 # Env variable
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI()
+# Initialize OpenAI client (responses are cached on disk, see llm_cache.py)
+client = CachedChatClient(lazy_object("openai client (prompt_template_control)", lambda: openai.OpenAI()))
 
 
+@telemetry.instrument("prompt_template.generate")
 def generate_video_prompt_with_template(role: str, setting: str, emotion: str, shot: str, duration: str) -> str:
     system_prompt = (
         "You are a video director who converts structured metadata into detailed, natural language video prompts.\n"
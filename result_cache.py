@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+DEFAULT_CACHE_DIR = os.environ.get("VIDEO_CACHE_DIR", "cache/videos")
+DEFAULT_CACHE_MAX_GB = float(os.environ.get("VIDEO_CACHE_MAX_GB", "20"))
+
+
+class VideoCache:
+    """
+    On-disk, content-addressed cache of generated videos.
+
+    Entries are stored as <key>.mp4 plus <key>.json metadata, where the key is a
+    SHA-256 of the model id, prompts and generation parameters. Writes are atomic
+    (temp file + os.replace), the least recently used entries are evicted once the
+    cache exceeds max_bytes, and concurrent requests for the same key share one
+    in-flight generation.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_gb=DEFAULT_CACHE_MAX_GB, enabled=True):
+        self.root = root
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_id, prompt, negative_prompt=None, **params):
+        payload = json.dumps(
+            {"model_id": model_id, "prompt": prompt, "negative_prompt": negative_prompt or "", "params": params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _video_path(self, key):
+        return os.path.join(self.root, f"{key}.mp4")
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key):
+        """
+        Return the cached video path or None. A hit refreshes the entry's LRU position.
+        """
+        if not self.enabled:
+            return None
+        path = self._video_path(key)
+        try:
+            # mtime doubles as the last-access time for eviction
+            os.utime(path, None)
+        except FileNotFoundError:
+            # Missing, or evicted by another request since
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def get_metadata(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, video_path, metadata=None):
+        """
+        Move a freshly generated video into the cache and return its cached path.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        target = self._video_path(key)
+        tmp = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.tmp")
+        shutil.move(video_path, tmp)
+        os.replace(tmp, target)
+
+        meta = dict(metadata or {})
+        meta.update({"key": key, "created_at": time.time(), "size_bytes": os.path.getsize(target)})
+        tmp_meta = tmp + ".json"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_meta, self._meta_path(key))
+
+        self.evict()
+        return target
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            if not name.endswith(".mp4"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for victim in (path, path[:-len(".mp4")] + ".json"):
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def _acquire_file_lock(self, key):
+        # Serialises identical generations across processes sharing the cache dir
+        if fcntl is None:
+            return None
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(os.path.join(self.root, f".{key}.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except BaseException:
+            lock_file.close()
+            raise
+        return lock_file
+
+    @staticmethod
+    def _release_file_lock(lock_file):
+        if lock_file is None:
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+    @contextmanager
+    def _file_lock(self, key):
+        lock_file = self._acquire_file_lock(key)
+        try:
+            yield
+        finally:
+            self._release_file_lock(lock_file)
+
+    def _claim(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def _release(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def get_or_create(self, key, create_fn, metadata=None):
+        """
+        Return the cached video for key, calling create_fn() -> path on a miss.
+        """
+        if not self.enabled:
+            return create_fn()
+        cached = self.get(key)
+        if cached:
+            return cached
+
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+        try:
+            with self._file_lock(key):
+                # Another process may have produced it while we waited for the lock
+                cached = self.get(key)
+                if cached is None:
+                    with self._lock:
+                        self.misses += 1
+                    cached = self.put(key, create_fn(), metadata)
+            future.set_result(cached)
+            return cached
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._release(key)
+
+    async def aget_or_create(self, key, create_coro_fn, metadata=None):
+        """
+        Async variant of get_or_create for coroutine producers. The cross-process
+        file lock is taken in a worker thread so waiting for it does not block the loop.
+        """
+        if not self.enabled:
+            return await create_coro_fn()
+        cached = self.get(key)
+        if cached:
+            return cached
+
+        future, owner = self._claim(key)
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            lock_file = await asyncio.to_thread(self._acquire_file_lock, key)
+            try:
+                # Another process may have produced it while we waited for the lock
+                cached = self.get(key)
+                if cached is None:
+                    with self._lock:
+                        self.misses += 1
+                    path = await create_coro_fn()
+                    cached = await asyncio.to_thread(self.put, key, path, metadata)
+            finally:
+                self._release_file_lock(lock_file)
+            future.set_result(cached)
+            return cached
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._release(key)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "shared_in_flight": self.shared,
+                    "in_flight": len(self._inflight)}
+
+
+video_cache = VideoCache(enabled=os.environ.get("VIDEO_CACHE", "1") != "0")
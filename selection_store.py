@@ -0,0 +1,234 @@
+import codecs
+import hashlib
+import json
+import os
+import time
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_SELECTION_DB = os.environ.get("SELECTION_DB_PATH", "data/storyboards.sqlite3")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS storyboards ("
+    "id INTEGER PRIMARY KEY, narrative_hash TEXT, narrative TEXT, version INTEGER, "
+    "data TEXT NOT NULL, created_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS selections ("
+    "id INTEGER PRIMARY KEY, storyboard_id INTEGER REFERENCES storyboards (id), narrative_hash TEXT, "
+    "narrative TEXT, version INTEGER, data TEXT NOT NULL, created_at REAL NOT NULL)",
+    # Byte offset already imported per legacy JSON file, so imports are resumable and idempotent
+    "CREATE TABLE IF NOT EXISTS legacy_imports (path TEXT PRIMARY KEY, offset INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS storyboards_narrative ON storyboards (narrative_hash, version)",
+    "CREATE INDEX IF NOT EXISTS storyboards_created ON storyboards (created_at)",
+    "CREATE INDEX IF NOT EXISTS selections_narrative ON selections (narrative_hash, version)",
+    "CREATE INDEX IF NOT EXISTS selections_version ON selections (version, created_at)",
+    "CREATE INDEX IF NOT EXISTS selections_created ON selections (created_at)",
+)
+
+
+def narrative_hash(narrative):
+    if narrative is None:
+        return None
+    return hashlib.sha256(narrative.strip().encode("utf-8")).hexdigest()
+
+
+class SelectionStore(SQLiteStore):
+    """
+    SQLite (WAL) store of generated storyboards and the selections users made from them.
+
+    Several Gradio worker processes can write to the same file: writes take SQLite's
+    write lock with BEGIN IMMEDIATE and wait up to busy_timeout_sec for it, and readers
+    never block writers. Commits are fsynced (synchronous=FULL). Lookups by narrative,
+    version and time go through indexes, so analytics never scan the whole history.
+    """
+
+    SCHEMA = _SCHEMA
+    SYNCHRONOUS = "FULL"
+
+    def __init__(self, path=DEFAULT_SELECTION_DB, busy_timeout_sec=10.0):
+        super().__init__(path, busy_timeout_sec)
+
+    def record_storyboards(self, narrative, storyboards):
+        """
+        Store one generation round of storyboards for a narrative; returns their row ids.
+        """
+        now = time.time()
+        digest = narrative_hash(narrative)
+        rows = [(digest, narrative, board.get("version"), json.dumps(board, ensure_ascii=False), now)
+                for board in storyboards]
+
+        def insert(conn):
+            ids = []
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT INTO storyboards (narrative_hash, narrative, version, data, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)", row
+                )
+                ids.append(cursor.lastrowid)
+            return ids
+
+        with self._lock:
+            return self._write(self._connection(), insert)
+
+    def record_selection(self, choice, narrative=None, created_at=None):
+        """
+        Store a selected storyboard and link it to the most recent generated storyboard
+        with the same narrative and version, if one was recorded. Returns the row id.
+        """
+        digest = narrative_hash(narrative)
+        version = choice.get("version") if isinstance(choice, dict) else None
+
+        def insert(conn):
+            row = conn.execute(
+                "SELECT id FROM storyboards WHERE narrative_hash = ? AND version = ? ORDER BY id DESC LIMIT 1",
+                (digest, version)
+            ).fetchone() if digest is not None else None
+            cursor = conn.execute(
+                "INSERT INTO selections (storyboard_id, narrative_hash, narrative, version, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (row[0] if row else None, digest, narrative, version,
+                 json.dumps(choice, ensure_ascii=False), created_at or time.time())
+            )
+            return cursor.lastrowid
+
+        with self._lock:
+            return self._write(self._connection(), insert)
+
+    def query_selections(self, narrative=None, version=None, since=None, until=None, limit=None):
+        """
+        Selections matching every given filter, newest first, as dicts.
+        """
+        clauses, params = [], []
+        if narrative is not None:
+            clauses.append("narrative_hash = ?")
+            params.append(narrative_hash(narrative))
+        if version is not None:
+            clauses.append("version = ?")
+            params.append(version)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        sql = "SELECT id, storyboard_id, narrative, version, data, created_at FROM selections"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [self._selection_dict(row) for row in rows]
+
+    @staticmethod
+    def _selection_dict(row):
+        return {"id": row[0], "storyboard_id": row[1], "narrative": row[2], "version": row[3],
+                "choice": json.loads(row[4]), "created_at": row[5]}
+
+    def version_counts(self, narrative=None, since=None):
+        """
+        Number of selections per storyboard version, answered from the indexes.
+        """
+        clauses, params = [], []
+        if narrative is not None:
+            clauses.append("narrative_hash = ?")
+            params.append(narrative_hash(narrative))
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        sql = "SELECT version, COUNT(*) FROM selections"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " GROUP BY version ORDER BY version"
+        with self._lock:
+            return dict(self._connection().execute(sql, params).fetchall())
+
+    def export_jsonl(self, output_path, since=None, batch_size=1000):
+        """
+        Write every selection (in insertion order) as one JSON line, reading in batches so the
+        export never holds the whole table in memory. Returns the number of rows written.
+        """
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        last_id, written = 0, 0
+        with open(output_path, "w") as out:
+            while True:
+                with self._lock:
+                    rows = self._connection().execute(
+                        "SELECT id, storyboard_id, narrative, version, data, created_at FROM selections "
+                        "WHERE id > ? AND created_at >= ? ORDER BY id LIMIT ?",
+                        (last_id, since or 0, batch_size)
+                    ).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    out.write(json.dumps(self._selection_dict(row), ensure_ascii=False) + "\n")
+                last_id = rows[-1][0]
+                written += len(rows)
+        return written
+
+    def import_legacy_json(self, path="selected_storyboards.json"):
+        """
+        Import selections from the old append-only JSON file. The file holds one JSON
+        document after another (either one per line or pretty-printed), so it is read
+        with raw_decode. Only bytes appended since the last import are read.
+        Returns the number of selections imported.
+        """
+        if not os.path.exists(path):
+            return 0
+        key = os.path.abspath(path)
+
+        def parse(offset):
+            with open(path, "rb") as f:
+                f.seek(offset)
+                # A writer may be mid-way through a multibyte character; stop before it
+                text = codecs.getincrementaldecoder("utf-8")().decode(f.read(), final=False)
+            decoder = json.JSONDecoder()
+            choices, position, consumed = [], 0, 0
+            while True:
+                while position < len(text) and text[position].isspace():
+                    position += 1
+                if position >= len(text):
+                    consumed = len(text)
+                    break
+                try:
+                    choice, position = decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    # A partially written final document; it is picked up by the next import
+                    break
+                choices.append(choice)
+                consumed = position
+            return choices, offset + len(text[:consumed].encode("utf-8"))
+
+        def insert(conn):
+            # Offset is read inside the write transaction so concurrent importers cannot both import
+            row = conn.execute("SELECT offset FROM legacy_imports WHERE path = ?", (key,)).fetchone()
+            choices, new_offset = parse(row[0] if row else 0)
+            # The legacy file has no timestamps; keep the file order by spacing rows by 1 ms
+            base = os.path.getmtime(path) - len(choices) * 1e-3
+            for i, choice in enumerate(choices):
+                version = choice.get("version") if isinstance(choice, dict) else None
+                conn.execute(
+                    "INSERT INTO selections (storyboard_id, narrative_hash, narrative, version, data, created_at) "
+                    "VALUES (NULL, NULL, NULL, ?, ?, ?)",
+                    (version, json.dumps(choice, ensure_ascii=False), base + i * 1e-3)
+                )
+            conn.execute("INSERT OR REPLACE INTO legacy_imports (path, offset) VALUES (?, ?)", (key, new_offset))
+            return len(choices)
+
+        with self._lock:
+            imported = self._write(self._connection(), insert)
+        if imported:
+            print(f"Imported {imported} legacy selections from {path}")
+        return imported
+
+    def stats(self):
+        with self._lock:
+            conn = self._connection()
+            storyboards = conn.execute("SELECT COUNT(*) FROM storyboards").fetchone()[0]
+            selections = conn.execute("SELECT COUNT(*) FROM selections").fetchone()[0]
+        return {"storyboards": storyboards, "selections": selections}
+
+
+selection_store = SelectionStore()
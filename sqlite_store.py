@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Base for the SQLite (WAL) stores shared by several processes.
+
+    Subclasses set SCHEMA (statements run once per connection) and SYNCHRONOUS. The
+    connection is opened lazily in autocommit mode; writes go through _write, which
+    takes SQLite's write lock with BEGIN IMMEDIATE and waits up to busy_timeout_sec
+    for it. Callers serialise access to the shared connection with self._lock.
+    """
+
+    SCHEMA = ()
+    SYNCHRONOUS = "FULL"
+
+    def __init__(self, path, busy_timeout_sec=10.0):
+        self.path = path
+        self.busy_timeout_sec = busy_timeout_sec
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Caller holds self._lock
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, timeout=self.busy_timeout_sec,
+                                         check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+            self._write(self._conn, lambda conn: [conn.execute(statement) for statement in self.SCHEMA])
+        return self._conn
+
+    @staticmethod
+    def _write(conn, fn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
@@ -1,45 +1,53 @@
 import json
 import re
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Dict, Tuple
 
 from dotenv import load_dotenv
 from typing import Dict
-from openai import OpenAI
+
+from lazy import lazy_import, lazy_object
+from llm_cache import CachedChatClient
+from telemetry import telemetry
+
+openai = lazy_import("openai")
 
 
 # Env variable
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI()
+# Initialize OpenAI client (responses are cached on disk, see llm_cache.py)
+client = CachedChatClient(lazy_object("openai client (storyboard)", lambda: openai.OpenAI()))
 
 
-def narrative_to_storyboard(narrative: str) -> Dict[str, str]:
-    """
-    Converts a narrative prompt into a structured storyboard dict
-    with scene, shot type, and emotion using an LLM.
-    """
-    system_prompt = (
-        "You are a professional storyboard artist and cinematographer. "
-        "Given a narrative, extract and describe:\n"
-        "- scene: The environment and visual setting\n"
-        "- shot_type: The camera angle or framing (e.g., wide shot, close-up)\n"
-        "- emotion: The overall mood or emotional tone\n\n"
-        "Return the result as a JSON dictionary with keys: scene, shot_type, emotion."
-    )
+STORYBOARD_SYSTEM_PROMPT = (
+    "You are a professional storyboard artist and cinematographer. "
+    "Given a narrative, extract and describe:\n"
+    "- scene: The environment and visual setting\n"
+    "- shot_type: The camera angle or framing (e.g., wide shot, close-up)\n"
+    "- emotion: The overall mood or emotional tone\n\n"
+    "Return the result as a JSON dictionary with keys: scene, shot_type, emotion."
+)
 
-    user_prompt = f"Narrative: {narrative}"
+EMPTY_STORYBOARD = {"scene": "", "shot_type": "", "emotion": ""}
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.3
-    )
 
-    content = response.choices[0].message.content.strip()
+def _storyboard_messages(narrative: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": STORYBOARD_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Narrative: {narrative}"}
+    ]
+
+
+def parse_storyboard(content: str) -> Dict[str, str]:
+    """
+    Parse a storyboard JSON response, falling back to extracting the first {...} block.
+    """
+    content = content.strip()
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
 
     # Use regex to extract JSON block
     json_match = re.search(r"\{[\s\S]*\}", content)
@@ -50,29 +58,112 @@ def narrative_to_storyboard(narrative: str) -> Dict[str, str]:
             return parsed_json
         except json.JSONDecodeError as e:
             print(f"JSON decode error: {e}")
-            return {"scene": "", "shot_type": "", "emotion": ""}
+            return dict(EMPTY_STORYBOARD)
     else:
         print("No JSON block found in response.")
-        return {"scene": "", "shot_type": "", "emotion": ""}
+        return dict(EMPTY_STORYBOARD)
 
 
-def generate_multiple_storyboards(narrative: str, num_versions: int = 5) -> List[Dict[str, str]]:
+@telemetry.instrument("storyboard.generate")
+def narrative_to_storyboard(narrative: str) -> Dict[str, str]:
     """
-    Generate multiple storyboards for the same narrative by calling the LLM-based
-    narrative_to_storyboard() function multiple times with slight variations.
+    Converts a narrative prompt into a structured storyboard dict
+    with scene, shot type, and emotion using an LLM.
     """
-    storyboards = []
+    response = client.chat.completions.create(
+        model="gpt-4o",
+        messages=_storyboard_messages(narrative),
+        temperature=0.3,
+        response_format={"type": "json_object"}
+    )
+
+    return parse_storyboard(response.choices[0].message.content)
 
-    for i in range(num_versions):
-        # Add variation to the narrative to encourage different outputs
-        variant_narrative = f"{narrative}\nPlease provide a different creative version #{i+1}."
-        storyboard = narrative_to_storyboard(variant_narrative)
+
+def _variant_narrative(narrative: str, i: int) -> str:
+    # Add variation to the narrative to encourage different outputs
+    return f"{narrative}\nPlease provide a different creative version #{i+1}."
+
+
+@telemetry.instrument("storyboard.generate_multiple")
+def generate_multiple_storyboards(narrative: str, num_versions: int = 5) -> List[Dict[str, str]]:
+    """
+    Generate multiple storyboards for the same narrative.
+
+    The fast path asks for all versions in one request via n= choices at a higher
+    temperature; if that fails, the per-version variant prompts are sent concurrently.
+    """
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=_storyboard_messages(narrative),
+            temperature=0.9,
+            n=num_versions,
+            response_format={"type": "json_object"}
+        )
+        storyboards = [parse_storyboard(choice.message.content) for choice in response.choices]
+    except Exception as e:
+        print(f"n-choice storyboard request failed, falling back to concurrent calls: {e}")
+        with ThreadPoolExecutor(max_workers=num_versions, thread_name_prefix="storyboard") as pool:
+            variants = [_variant_narrative(narrative, i) for i in range(num_versions)]
+            storyboards = list(pool.map(narrative_to_storyboard, variants))
+
+    for i, storyboard in enumerate(storyboards):
         storyboard['version'] = i + 1  # Track version number
-        storyboards.append(storyboard)
 
     return storyboards
 
 
+def iter_multiple_storyboards(narrative: str, num_versions: int = 5) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Streaming variant of generate_multiple_storyboards: yield (index, storyboard) as
+    each version completes instead of after the slowest one.
+
+    The n-choice request is streamed and a choice is parsed as soon as it finishes.
+    Versions the stream did not deliver are filled in with concurrent variant-prompt
+    calls, yielded in completion order.
+    """
+    buffers = [""] * num_versions
+    delivered = set()
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=_storyboard_messages(narrative),
+            temperature=0.9,
+            n=num_versions,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+        for chunk in stream:
+            for choice in chunk.choices:
+                if choice.index >= num_versions or choice.index in delivered:
+                    continue
+                if choice.delta is not None and choice.delta.content:
+                    buffers[choice.index] += choice.delta.content
+                if choice.finish_reason is not None:
+                    delivered.add(choice.index)
+                    storyboard = parse_storyboard(buffers[choice.index])
+                    storyboard['version'] = choice.index + 1
+                    yield choice.index, storyboard
+    except Exception as e:
+        print(f"Streamed storyboard request failed, falling back to concurrent calls: {e}")
+
+    missing = [i for i in range(num_versions) if i not in delivered]
+    if not missing:
+        return
+    with ThreadPoolExecutor(max_workers=len(missing), thread_name_prefix="storyboard") as pool:
+        futures = {pool.submit(narrative_to_storyboard, _variant_narrative(narrative, i)): i for i in missing}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                storyboard = future.result()
+            except Exception as e:
+                print(f"Storyboard version {i + 1} failed: {e}")
+                storyboard = dict(EMPTY_STORYBOARD)
+            storyboard['version'] = i + 1
+            yield i, storyboard
+
+
 if __name__ == "__main__":
     print("Testing Narrative to Storyboard...")
     narrative_text = "A girl walks into a dark forest on a misty night."
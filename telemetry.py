@@ -0,0 +1,317 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = "video_pipeline"
+# Seconds; spans range from cache lookups to multi-minute renders
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+                   600.0, 1800.0)
+DEFAULT_METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+
+_current_trace = contextvars.ContextVar("telemetry_trace", default=None)
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Trace:
+    """
+    Spans recorded while handling one request (e.g. one generation job).
+    """
+
+    def __init__(self, trace_id, attrs):
+        self.id = trace_id
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.finished = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def summary(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_sec"])
+        stages = OrderedDict()
+        for span in spans:
+            stages[span["name"]] = round(stages.get(span["name"], 0.0) + span["duration_sec"], 4)
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return {
+            "trace_id": self.id,
+            "attrs": self.attrs,
+            "total_sec": round(end - self.started, 4),
+            "finished": self.finished is not None,
+            "stages": stages,
+            "spans": spans,
+        }
+
+
+class Telemetry:
+    """
+    In-process spans, histograms and gauges with a Prometheus text endpoint.
+
+    `span` times a block into the {METRIC_PREFIX}_span_seconds histogram (labelled by
+    span name plus any extra labels) and, inside a `trace`, also records it on that
+    request's timeline. Traces follow contextvars, so they survive asyncio.to_thread
+    and tasks. Gauges are either callbacks evaluated at scrape time or values moved
+    with `adjust`.
+    """
+
+    def __init__(self, max_traces=500, buckets=DEFAULT_BUCKETS):
+        self.max_traces = max_traces
+        self.buckets = buckets
+        self._histograms = {}
+        self._errors = {}
+        self._gauge_callbacks = OrderedDict()
+        self._gauge_values = {}
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @contextmanager
+    def span(self, name, **labels):
+        trace = _current_trace.get()
+        parent = _current_span.get()
+        token = _current_span.set(name)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _current_span.reset(token)
+            self.observe(name, duration, error, **labels)
+            if trace is not None:
+                record = {"name": name, "parent": parent, "start_sec": round(start - trace.started, 4),
+                          "duration_sec": round(duration, 4)}
+                if labels:
+                    record["labels"] = {key: str(value) for key, value in labels.items()}
+                if error:
+                    record["error"] = error
+                trace.add(record)
+
+    def instrument(self, name=None, **labels):
+        """
+        Decorator wrapping every call of a (sync or async) function in a span.
+        """
+        def decorator(fn):
+            span_name = name or fn.__name__
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name, **labels):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, duration, error=None, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+            if error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def summary(self):
+        """
+        {span: {"count", "total_sec", "mean_sec", "errors"}} aggregated over all labels.
+        """
+        with self._lock:
+            histograms = list(self._histograms.items())
+            errors = dict(self._errors)
+        result = {}
+        for (name, labels), histogram in sorted(histograms, key=lambda item: item[0]):
+            row = result.setdefault(name, {"count": 0, "total_sec": 0.0, "errors": 0})
+            row["count"] += histogram.count
+            row["total_sec"] += histogram.total
+            row["errors"] += errors.get((name, labels), 0)
+        for row in result.values():
+            row["mean_sec"] = round(row["total_sec"] / row["count"], 4) if row["count"] else 0.0
+            row["total_sec"] = round(row["total_sec"], 4)
+        return result
+
+    @contextmanager
+    def trace(self, trace_id, **attrs):
+        """
+        Collect every span opened inside the block under trace_id (see get_trace).
+        """
+        trace = Trace(trace_id, attrs)
+        with self._lock:
+            self._traces[trace_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            trace.finished = time.perf_counter()
+            _current_trace.reset(token)
+
+    def get_trace(self, trace_id):
+        """
+        Per-stage timing breakdown of a trace, or None if it is unknown or was dropped.
+        """
+        with self._lock:
+            trace = self._traces.get(trace_id)
+        return trace.summary() if trace is not None else None
+
+    def recent_traces(self, limit=20):
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [trace.summary() for trace in reversed(traces)]
+
+    def gauge(self, name, fn, help="", label=None):
+        """
+        Register a gauge read at scrape time. fn returns a number, or with `label`
+        a {label_value: number} dict.
+        """
+        with self._lock:
+            self._gauge_callbacks[name] = (fn, help, label)
+
+    def adjust(self, name, delta, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauge_values[key] = self._gauge_values.get(key, 0) + delta
+
+    @contextmanager
+    def track(self, name, **labels):
+        """
+        Raise a gauge by one for the duration of the block (e.g. requests in flight).
+        """
+        self.adjust(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.adjust(name, -1, **labels)
+
+    def _gauge_samples(self):
+        with self._lock:
+            callbacks = list(self._gauge_callbacks.items())
+            samples = [(name, "", key, value) for (name, key), value in self._gauge_values.items()]
+        for name, (fn, help, label) in callbacks:
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"Gauge {name} failed: {e}")
+                continue
+            if label is None:
+                samples.append((name, help, (), value))
+            else:
+                samples.extend((name, help, ((label, str(label_value)),), v) for label_value, v in value.items())
+        return samples
+
+    def render_prometheus(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = [(key, list(h.counts), h.total, h.count) for key, h in self._histograms.items()]
+            errors = list(self._errors.items())
+
+        metric = f"{METRIC_PREFIX}_span_seconds"
+        lines = [f"# HELP {metric} Duration of instrumented pipeline stages.", f"# TYPE {metric} histogram"]
+        for (name, labels), counts, total, count in sorted(histograms):
+            key = (("span", name),) + labels
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{metric}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {bucket_count}")
+            lines.append(f"{metric}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {total}")
+            lines.append(f"{metric}_count{_format_labels(key)} {count}")
+
+        metric = f"{METRIC_PREFIX}_span_errors_total"
+        lines += [f"# HELP {metric} Instrumented stages that raised.", f"# TYPE {metric} counter"]
+        for (name, labels), count in sorted(errors):
+            lines.append(f"{metric}{_format_labels((('span', name),) + labels)} {count}")
+
+        declared = set()
+        for name, help, labels, value in sorted(self._gauge_samples(), key=lambda sample: sample[0]):
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                if help:
+                    lines.append(f"# HELP {metric} {help}")
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{_format_labels(labels)} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=DEFAULT_METRICS_PORT, host="0.0.0.0"):
+        """
+        Serve /metrics (Prometheus) and /traces (recent breakdowns, JSON) on a daemon thread.
+        """
+        if self._server is not None:
+            return self._server
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body, content_type = telemetry.render_prometheus(), "text/plain; version=0.0.4"
+                elif self.path.startswith("/traces"):
+                    body, content_type = json.dumps(telemetry.recent_traces()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics endpoint on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+
+telemetry = Telemetry()
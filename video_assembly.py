@@ -0,0 +1,121 @@
+import os
+import subprocess
+import tempfile
+import uuid
+
+import cv2
+
+from video_export import DEFAULT_CODEC, DEFAULT_CRF, find_ffmpeg
+
+
+def probe_clip(path):
+    """
+    Return codec fourcc, resolution, fps and duration of a clip.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    info = {
+        "codec": "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv2.CAP_PROP_FPS), 3),
+        "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
+    cap.release()
+    info["duration"] = info["frames"] / info["fps"] if info["fps"] else 0.0
+    return info
+
+
+def _run_ffmpeg(args):
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required to stitch clips")
+    result = subprocess.run([ffmpeg, "-y", "-loglevel", "error"] + args, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace')}")
+
+
+def _concat_copy(paths, tmp_path):
+    # concat demuxer: packets are copied, nothing is decoded or re-encoded
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    try:
+        _run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_file.name, "-c", "copy",
+                     "-movflags", "+faststart", tmp_path])
+    finally:
+        os.remove(list_file.name)
+
+
+def _concat_reencode(paths, probes, crossfades, tmp_path, codec, crf):
+    width, height, fps = probes[0]["width"], probes[0]["height"], probes[0]["fps"]
+    inputs, filters = [], []
+    for i, path in enumerate(paths):
+        inputs += ["-i", path]
+        # Normalise every clip to the first clip's geometry and frame rate
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{i}]"
+        )
+
+    current, length = "[v0]", probes[0]["duration"]
+    for i in range(1, len(paths)):
+        fade = min(crossfades[i - 1], probes[i - 1]["duration"], probes[i]["duration"])
+        label = f"[x{i}]"
+        if fade > 0:
+            filters.append(f"{current}[v{i}]xfade=transition=fade:duration={fade:.3f}:offset={length - fade:.3f}{label}")
+            length += probes[i]["duration"] - fade
+        else:
+            filters.append(f"{current}[v{i}]concat=n=2:v=1:a=0{label}")
+            length += probes[i]["duration"]
+        current = label
+
+    _run_ffmpeg(inputs + ["-filter_complex", ";".join(filters), "-map", current, "-an",
+                          "-c:v", codec, "-crf", str(crf), "-pix_fmt", "yuv420p",
+                          "-movflags", "+faststart", tmp_path])
+
+
+def stitch_clips(paths, output_path=None, crossfades=None, codec=DEFAULT_CODEC, crf=DEFAULT_CRF):
+    """
+    Concatenate clips in order into one video and return its path.
+
+    crossfades holds one duration (seconds) per boundary, 0 for a hard cut. Without
+    crossfades and with matching codec, resolution and fps the clips are stream-copied;
+    otherwise they are normalised and re-encoded (audio is dropped in that case).
+    ffmpeg reads the clips from disk, so they are never loaded into memory here.
+    """
+    if not paths:
+        raise ValueError("No clips to stitch")
+    crossfades = list(crossfades or [0.0] * (len(paths) - 1))
+    if output_path is None:
+        output_path = f"output/sequence-{uuid.uuid4().hex}.mp4"
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    probes = [probe_clip(path) for path in paths]
+    signature = {(p["codec"], p["width"], p["height"], p["fps"]) for p in probes}
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.part.mp4"
+    try:
+        if len(signature) == 1 and not any(crossfades):
+            _concat_copy(paths, tmp_path)
+        else:
+            _concat_reencode(paths, probes, crossfades, tmp_path, codec, crf)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def stitch_scene_sequence(scene_sequence, crossfade_sec=0.0, output_path=None):
+    """
+    Stitch the successful keyframes of a build_scene_sequence result in keyframe order,
+    with a crossfade of crossfade_sec between every pair of consecutive clips.
+    """
+    steps = [step for step in scene_sequence if step and step.get("video_path")]
+    if not steps:
+        return None
+    crossfades = [crossfade_sec] * (len(steps) - 1)
+    return stitch_clips([step["video_path"] for step in steps], output_path, crossfades)
@@ -0,0 +1,117 @@
+import contextvars
+import os
+import shutil
+import subprocess
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from lazy import lazy_import
+from telemetry import telemetry
+
+imageio_ffmpeg = lazy_import("imageio_ffmpeg")
+diffusers_utils = lazy_import("diffusers.utils")
+
+
+DEFAULT_CODEC = os.environ.get("VIDEO_EXPORT_CODEC", "libx264")
+DEFAULT_CRF = int(os.environ.get("VIDEO_EXPORT_CRF", "18"))
+DEFAULT_PRESET = os.environ.get("VIDEO_EXPORT_PRESET", "medium")
+
+
+def find_ffmpeg():
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def _to_uint8(frame):
+    frame = np.asarray(frame)
+    if frame.dtype != np.uint8:
+        frame = (np.clip(frame, 0.0, 1.0) * 255).round().astype(np.uint8)
+    if frame.ndim == 2:
+        frame = np.repeat(frame[..., None], 3, axis=-1)
+    return np.ascontiguousarray(frame[..., :3])
+
+
+class VideoExporter:
+    """
+    Encodes frame streams to mp4 on background worker threads.
+
+    `export` returns a Future immediately; frames (an iterable of HxWx3 float [0, 1]
+    or uint8 arrays, or PIL images) are converted one at a time and piped to ffmpeg,
+    so no second full copy of the clip is built. Output is written to a temp file
+    and renamed into place when encoding succeeds.
+    """
+
+    def __init__(self, max_workers=2, codec=DEFAULT_CODEC, crf=DEFAULT_CRF, preset=DEFAULT_PRESET):
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-export")
+
+    def export(self, frames, output_path=None, fps=16, codec=None, crf=None):
+        if output_path is None:
+            output_path = f"output/video-{uuid.uuid4().hex}.mp4"
+        telemetry.adjust("video_export_pending", 1)
+        # Run in the caller's context so the encode span joins the caller's trace
+        future = self._pool.submit(contextvars.copy_context().run, self._encode, frames, output_path, fps,
+                                   codec or self.codec, self.crf if crf is None else crf)
+        future.add_done_callback(lambda _: telemetry.adjust("video_export_pending", -1))
+        return future
+
+    @telemetry.instrument("video.encode")
+    def _encode(self, frames, output_path, fps, codec, crf):
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None:
+            # No ffmpeg binary available: fall back to the buffered diffusers writer
+            diffusers_utils.export_to_video(list(frames), output_path, fps=fps)
+            return output_path
+
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.part.mp4"
+        process = None
+        try:
+            for frame in frames:
+                frame = _to_uint8(frame)
+                if process is None:
+                    height, width = frame.shape[:2]
+                    process = subprocess.Popen(
+                        [ffmpeg, "-y", "-loglevel", "error",
+                         "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                         "-c:v", codec, "-crf", str(crf), "-preset", self.preset, "-pix_fmt", "yuv420p",
+                         "-movflags", "+faststart", tmp_path],
+                        stdin=subprocess.PIPE, stderr=subprocess.PIPE
+                    )
+                try:
+                    process.stdin.write(frame.tobytes())
+                except BrokenPipeError as e:
+                    # ffmpeg exited early; its stderr says why
+                    stderr = process.stderr.read()
+                    raise RuntimeError(f"ffmpeg exited with code {process.wait()}: "
+                                       f"{stderr.decode(errors='replace')}") from e
+            if process is None:
+                raise ValueError("No frames to export")
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')}")
+            os.replace(tmp_path, output_path)
+            return output_path
+        except BaseException:
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+video_exporter = VideoExporter()
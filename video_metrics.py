@@ -0,0 +1,156 @@
+import cv2
+import numpy as np
+from PIL import Image
+from coherence import CoherenceEngine
+from motion import make_estimator
+
+
+class FrameConsumer:
+    """
+    Base class for metrics fed by analyze_video.
+
+    `start` receives the (strided) number of frames the analyzer expects to deliver,
+    the downscale factor and the frame stride, `consume` gets each decoded BGR frame
+    together with its grayscale version, and `result` returns the metric once the
+    video is exhausted.
+    """
+
+    name = "frame_consumer"
+
+    def start(self, expected_frames, scale=1.0, stride=1):
+        pass
+
+    def consume(self, index, frame, gray):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class MotionConsumer(FrameConsumer):
+    """
+    Mean motion between consecutive frames using a motion.py estimator
+    (Farneback by default).
+
+    Displacements measured on downscaled or strided frames are converted back to
+    full-resolution pixels per source frame, so scores stay comparable across settings.
+    """
+
+    name = "motion_score"
+
+    def __init__(self, estimator="farneback"):
+        self.estimator = make_estimator(estimator)
+        self.prev_gray = None
+        self.motion_values = []
+        self.normaliser = 1.0
+
+    def start(self, expected_frames, scale=1.0, stride=1):
+        if self.estimator.is_displacement:
+            self.normaliser = 1.0 / (scale * stride)
+
+    def consume(self, index, frame, gray):
+        if self.prev_gray is not None:
+            self.motion_values.append(self.estimator.estimate(self.prev_gray, gray))
+        self.prev_gray = gray
+
+    def result(self):
+        return np.mean(self.motion_values) * self.normaliser if self.motion_values else 0
+
+
+class CoherenceConsumer(FrameConsumer):
+    """
+    Mean SSIM between consecutive grayscale frames (see coherence.py; pyramid_level
+    0 matches skimage's structural_similarity).
+    """
+
+    name = "temporal_coherence"
+
+    def __init__(self, pyramid_level=0):
+        self.engine = CoherenceEngine(pyramid_level)
+        self.ssim_scores = []
+
+    def consume(self, index, frame, gray):
+        score = self.engine.push(gray)
+        if score is not None:
+            self.ssim_scores.append(score)
+
+    def result(self):
+        return np.mean(self.ssim_scores) if self.ssim_scores else 0
+
+
+class ClipFrameSampler(FrameConsumer):
+    """
+    Keep `num_samples` evenly spaced RGB frames (as PIL images) for CLIP scoring.
+    """
+
+    name = "clip_frames"
+
+    def __init__(self, num_samples=8):
+        self.num_samples = num_samples
+        self.wanted = None
+        self.frames = []
+
+    def start(self, expected_frames, scale=1.0, stride=1):
+        if expected_frames > 0:
+            self.wanted = set(np.linspace(0, expected_frames - 1, self.num_samples).round().astype(int).tolist())
+
+    def consume(self, index, frame, gray):
+        # Without a reliable frame count, sample the first num_samples frames
+        if self.wanted is None:
+            keep = len(self.frames) < self.num_samples
+        else:
+            keep = index in self.wanted
+        if keep:
+            self.frames.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+
+    def result(self):
+        return self.frames
+
+
+def _downscale(frame, max_side):
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def analyze_video(video_path, consumers, stride=1, max_side=None):
+    """
+    Decode the video once and feed every kept frame to each consumer.
+
+    stride keeps every n-th frame, max_side downscales frames so their longest side
+    is at most that many pixels. Returns {consumer.name: consumer.result()}.
+    """
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    expected = (frame_count + stride - 1) // stride if frame_count > 0 else 0
+    longest_side = max(cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    scale = min(1.0, max_side / longest_side) if max_side and longest_side else 1.0
+    for consumer in consumers:
+        consumer.start(expected, scale, stride)
+
+    frame_index = 0
+    kept_index = 0
+    while cap.isOpened():
+        if frame_index % stride:
+            # grab() skips the colour conversion and copy of frames we do not use
+            if not cap.grab():
+                break
+            frame_index += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_index += 1
+
+        if max_side:
+            frame = _downscale(frame, max_side)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        for consumer in consumers:
+            consumer.consume(kept_index, frame, gray)
+        kept_index += 1
+
+    cap.release()
+    return {consumer.name: consumer.result() for consumer in consumers}
@@ -0,0 +1,419 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_BROKER_PATH = os.environ.get("JOB_BROKER_PATH", "data/jobs.sqlite3")
+# Worker processes started by WorkerPool when none is given explicitly
+DEFAULT_NUM_WORKERS = int(os.environ.get("WORKER_POOL_SIZE", "2"))
+# Workers touch their running jobs this often; jobs silent for STALE_JOB_SEC are re-queued
+HEARTBEAT_SEC = 5.0
+STALE_JOB_SEC = 60.0
+# Jobs started per user in this window decide whose job is claimed next
+FAIR_SHARE_WINDOW_SEC = 600.0
+
+PRIORITY_BATCH = 0
+PRIORITY_INTERACTIVE = 10
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id TEXT PRIMARY KEY, kind TEXT NOT NULL, user TEXT NOT NULL, model_id TEXT NOT NULL, prompt TEXT, "
+    "negative_prompt TEXT, params TEXT NOT NULL, priority INTEGER NOT NULL, status TEXT NOT NULL, "
+    "stage TEXT, detail TEXT, progress REAL, result TEXT, error TEXT, timings TEXT, worker_id TEXT, "
+    "attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+    "heartbeat_at REAL)",
+    "CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)",
+    "CREATE INDEX IF NOT EXISTS jobs_user_started ON jobs (user, started_at)",
+    "CREATE INDEX IF NOT EXISTS jobs_worker ON jobs (worker_id, status)",
+)
+
+_STATUS_COLUMNS = ("id, model_id, status, stage, detail, progress, result, error, timings, attempts, "
+                   "created_at, finished_at")
+
+
+class JobBroker(SQLiteStore):
+    """
+    SQLite (WAL) job queue shared by the Gradio frontend and the worker processes.
+
+    The frontend enqueues and polls; workers claim jobs under BEGIN IMMEDIATE, so a job
+    is handed to exactly one worker even across processes. A claim takes the highest
+    priority first, then the job of the user who started the fewest jobs in the last
+    fair_share_window_sec, then the oldest. Jobs of a dead or silent worker go back to
+    the queue until they have been attempted max_attempts times.
+    """
+
+    SCHEMA = _SCHEMA
+    SYNCHRONOUS = "NORMAL"
+
+    def __init__(self, path=DEFAULT_BROKER_PATH, busy_timeout_sec=10.0, max_attempts=3,
+                 fair_share_window_sec=FAIR_SHARE_WINDOW_SEC):
+        super().__init__(path, busy_timeout_sec)
+        self.max_attempts = max_attempts
+        self.fair_share_window_sec = fair_share_window_sec
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._write(self._connection(), lambda conn: conn.execute(sql, params).rowcount)
+
+    def enqueue(self, kind, model_id, prompt, negative_prompt=None, params=None, user=None,
+                priority=PRIORITY_BATCH):
+        """
+        Queue a job for the workers and return its id.
+        """
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, user, model_id, prompt, negative_prompt, params, priority, status, "
+            "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, kind, user or "anonymous", model_id, prompt, negative_prompt,
+             json.dumps(params or {}), priority, time.time())
+        )
+        return job_id
+
+    def submit_video_job(self, prompt, model_id, negative_prompt=None, preset=None, seed=None, user=None,
+                         priority=PRIORITY_BATCH):
+        """
+        Worker-pool counterpart of generation.submit_video_job.
+        """
+        return self.enqueue("generate", model_id, prompt, negative_prompt, {"preset": preset, "seed": seed},
+                            user, priority)
+
+    def submit_refine_job(self, video_path, prompt, negative_prompt=None, preset=None, strength=0.6, seed=None,
+                          user=None, priority=PRIORITY_BATCH):
+        """
+        Worker-pool counterpart of generation.submit_refine_job.
+        """
+        params = {"video_path": video_path, "preset": preset, "strength": strength, "seed": seed}
+        return self.enqueue("refine", "Wan2.1", prompt, negative_prompt, params, user, priority)
+
+    def claim(self, worker_id, models=None):
+        """
+        Hand the next job to worker_id and mark it running; returns the job dict or None.
+        models limits the claim to jobs for those backends.
+        """
+        now = time.time()
+        sql = (
+            "SELECT j.id FROM jobs j LEFT JOIN ("
+            "  SELECT user, COUNT(*) AS started FROM jobs WHERE started_at >= ? GROUP BY user"
+            ") usage ON usage.user = j.user WHERE j.status = 'queued'"
+        )
+        params = [now - self.fair_share_window_sec]
+        if models:
+            sql += f" AND j.model_id IN ({', '.join('?' * len(models))})"
+            params += list(models)
+        sql += " ORDER BY j.priority DESC, COALESCE(usage.started, 0), j.created_at LIMIT 1"
+
+        def take(conn):
+            row = conn.execute(sql, params).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'running', detail = '', worker_id = ?, "
+                "attempts = attempts + 1, started_at = ?, heartbeat_at = ? WHERE id = ?", (worker_id, now, now, row[0])
+            )
+            return conn.execute(
+                "SELECT id, kind, user, model_id, prompt, negative_prompt, params, attempts FROM jobs WHERE id = ?",
+                (row[0],)
+            ).fetchone()
+
+        with self._lock:
+            row = self._write(self._connection(), take)
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "user": row[2], "model_id": row[3], "prompt": row[4],
+                "negative_prompt": row[5], "params": json.loads(row[6]), "attempts": row[7]}
+
+    def heartbeat(self, worker_id):
+        return self._execute("UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = 'running'",
+                             (time.time(), worker_id))
+
+    def report(self, job_id, worker_id, stage, detail="", progress=None, timings=None):
+        """
+        Progress of a running job, as seen by the worker that owns it.
+        """
+        return self._execute(
+            "UPDATE jobs SET stage = ?, detail = ?, progress = ?, timings = ?, heartbeat_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (stage, detail, progress, json.dumps(timings), time.time(), job_id, worker_id)
+        )
+
+    def finish(self, job_id, worker_id, result=None, error=None, timings=None):
+        """
+        Mark the job done (or failed if error is set). Ignored if the job was meanwhile
+        re-queued and handed to another worker.
+        """
+        return self._execute(
+            "UPDATE jobs SET status = ?, stage = NULL, result = ?, error = ?, timings = COALESCE(?, timings), "
+            "finished_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            ("failed" if error else "done", result, error, json.dumps(timings) if timings else None,
+             time.time(), job_id, worker_id)
+        )
+
+    def _requeue(self, where, params, reason):
+        def requeue(conn):
+            failed = conn.execute(
+                f"UPDATE jobs SET status = 'failed', stage = NULL, error = ?, finished_at = ? "
+                f"WHERE status = 'running' AND attempts >= ? AND {where}",
+                [f"{reason} ({self.max_attempts} attempts)", time.time(), self.max_attempts] + params
+            ).rowcount
+            requeued = conn.execute(
+                f"UPDATE jobs SET status = 'queued', stage = 'requeued', detail = ?, progress = NULL, "
+                f"worker_id = NULL WHERE status = 'running' AND {where}", [reason] + params
+            ).rowcount
+            return requeued, failed
+
+        with self._lock:
+            requeued, failed = self._write(self._connection(), requeue)
+        if requeued or failed:
+            print(f"{reason}: re-queued {requeued} jobs, failed {failed}")
+        return requeued
+
+    def requeue_worker(self, worker_id):
+        """
+        Put the running jobs of a dead worker back on the queue; returns how many.
+        """
+        return self._requeue("worker_id = ?", [worker_id], f"Worker {worker_id} exited")
+
+    def requeue_stale(self, stale_sec=STALE_JOB_SEC):
+        """
+        Re-queue running jobs without a heartbeat for stale_sec, e.g. after the supervisor itself died.
+        """
+        return self._requeue("heartbeat_at < ?", [time.time() - stale_sec], "Worker stopped heartbeating")
+
+    @staticmethod
+    def _status_dict(row):
+        return {
+            "job_id": row[0],
+            "model_id": row[1],
+            # While running, the worker's stage (e.g. "denoising", "polling") stands in for "running"
+            "status": (row[3] or row[2]) if row[2] == "running" else row[2],
+            "detail": row[4] or "",
+            "progress": row[5],
+            "result": row[6],
+            "error": row[7],
+            "timings": json.loads(row[8]) if row[8] else None,
+            "attempts": row[9],
+            "elapsed_sec": round((row[11] or time.time()) - row[10], 1),
+            "finished": row[2] in ("done", "failed"),
+        }
+
+    def status(self, job_id):
+        """
+        Status dict in the shape of generation.get_video_job.
+        """
+        with self._lock:
+            row = self._connection().execute(f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE id = ?",
+                                             (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown job id: {job_id}")
+        return self._status_dict(row)
+
+    def watch(self, job_id, interval=0.5):
+        """
+        Yield the status dict whenever it changes; the last one yielded is the finished job.
+        """
+        last = None
+        while True:
+            status = self.status(job_id)
+            current = (status["status"], status["detail"], status["progress"])
+            if status["finished"] or current != last:
+                last = current
+                yield status
+            if status["finished"]:
+                return
+            time.sleep(interval)
+
+    def iter_finished(self, job_ids, interval=0.5):
+        """
+        Yield (job_id, status) for each of job_ids as it finishes, in completion order.
+        """
+        pending = set(job_ids)
+        while pending:
+            placeholders = ", ".join("?" * len(pending))
+            with self._lock:
+                rows = self._connection().execute(
+                    f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE id IN ({placeholders}) "
+                    f"AND status IN ('done', 'failed') ORDER BY finished_at", list(pending)
+                ).fetchall()
+            for row in rows:
+                pending.discard(row[0])
+                yield row[0], self._status_dict(row)
+            if pending:
+                time.sleep(interval)
+
+    def result(self, job_id, timeout=None, interval=0.5):
+        """
+        Block until the job finishes and return its video path (raises on failure).
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            status = self.status(job_id)
+            if status["finished"]:
+                break
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"Job {job_id} still {status['status']} after {timeout}s")
+            time.sleep(interval)
+        if status["error"]:
+            raise Exception(status["error"])
+        return status["result"]
+
+    def counts(self):
+        """
+        Number of jobs per status.
+        """
+        with self._lock:
+            return dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+job_broker = JobBroker()
+
+
+def _run_job(broker, worker_id, job):
+    # Runs on this process's job manager, so the video cache, pipeline registry and
+    # telemetry trace work as they do in-process
+    from generation import submit_refine_job, submit_video_job, watch_video_job
+
+    params = {key: value for key, value in job["params"].items() if value is not None}
+    status = None
+    try:
+        if job["kind"] == "refine":
+            local_id = submit_refine_job(params.pop("video_path"), job["prompt"], job["negative_prompt"], **params)
+        else:
+            local_id = submit_video_job(job["prompt"], job["model_id"], job["negative_prompt"], **params)
+        for status in watch_video_job(local_id):
+            if status["status"] not in ("done", "failed"):
+                broker.report(job["id"], worker_id, status["status"], status["detail"], status["progress"],
+                              status["timings"])
+    except Exception as e:
+        broker.finish(job["id"], worker_id, error=str(e))
+        return
+    broker.finish(job["id"], worker_id, result=status["result"], error=status["error"], timings=status["timings"])
+
+
+def run_worker(worker_id, broker_path=DEFAULT_BROKER_PATH, models=None, poll_sec=0.5,
+               heartbeat_sec=HEARTBEAT_SEC):
+    """
+    Worker process main loop: claim a job, run it, report back, repeat.
+
+    Pipelines stay loaded in this process between jobs. A heartbeat thread keeps the
+    claimed job alive in the broker during long renders and remote polls.
+    """
+    broker = JobBroker(broker_path)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(heartbeat_sec):
+            try:
+                broker.heartbeat(worker_id)
+            except Exception as e:
+                print(f"Worker {worker_id} heartbeat failed: {e}")
+
+    threading.Thread(target=beat, name="worker-heartbeat", daemon=True).start()
+    print(f"Worker {worker_id} started (pid {os.getpid()}, models: {', '.join(models) if models else 'all'})")
+    try:
+        while True:
+            job = broker.claim(worker_id, models)
+            if job is None:
+                time.sleep(poll_sec)
+                continue
+            print(f"Worker {worker_id} running job {job['id']} ({job['model_id']}, attempt {job['attempts']})")
+            _run_job(broker, worker_id, job)
+    finally:
+        stop.set()
+
+
+class WorkerPool:
+    """
+    Supervise num_workers worker processes sharing one broker.
+
+    Workers are spawned (not forked) so they never inherit the frontend's threads or
+    event loops. A monitor thread restarts any worker that exits, after re-queueing
+    the jobs it held, and periodically re-queues jobs whose worker went silent.
+    """
+
+    def __init__(self, num_workers=DEFAULT_NUM_WORKERS, broker_path=DEFAULT_BROKER_PATH, models=None,
+                 check_sec=2.0, stale_sec=STALE_JOB_SEC):
+        self.num_workers = num_workers
+        self.broker = JobBroker(broker_path)
+        self.models = list(models) if models else None
+        self.check_sec = check_sec
+        self.stale_sec = stale_sec
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._spawned = 0
+        self._stop = threading.Event()
+        self._monitor_thread = None
+
+    def _spawn(self, slot):
+        self._spawned += 1
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{slot}-{self._spawned}"
+        process = self._context.Process(target=run_worker, args=(worker_id, self.broker.path, self.models),
+                                        name=f"video-worker-{slot}", daemon=True)
+        process.start()
+        self._workers[slot] = (worker_id, process)
+
+    def start(self):
+        if self._monitor_thread is not None:
+            return self
+        # Jobs left running by a previous supervisor that died
+        self.broker.requeue_stale(self.stale_sec)
+        for slot in range(self.num_workers):
+            self._spawn(slot)
+        self._monitor_thread = threading.Thread(target=self._monitor, name="worker-pool-monitor", daemon=True)
+        self._monitor_thread.start()
+        return self
+
+    def _monitor(self):
+        while not self._stop.wait(self.check_sec):
+            for slot, (worker_id, process) in list(self._workers.items()):
+                if process.is_alive():
+                    continue
+                print(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                self.broker.requeue_worker(worker_id)
+                self.restarts += 1
+                self._spawn(slot)
+            self.broker.requeue_stale(self.stale_sec)
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        for worker_id, process in self._workers.values():
+            process.terminate()
+        for worker_id, process in self._workers.values():
+            process.join(timeout)
+            self.broker.requeue_worker(worker_id)
+        self._workers.clear()
+        self._monitor_thread = None
+
+    def stats(self):
+        return {
+            "workers": {worker_id: process.is_alive() for worker_id, process in self._workers.values()},
+            "restarts": self.restarts,
+            "jobs": self.broker.counts(),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run video generation workers against the job broker")
+    parser.add_argument("--workers", type=int, default=DEFAULT_NUM_WORKERS)
+    parser.add_argument("--models", default=None, help="Comma-separated backends to serve (default: all)")
+    parser.add_argument("--broker", default=DEFAULT_BROKER_PATH)
+    args = parser.parse_args(argv)
+
+    models = [model.strip() for model in args.models.split(",")] if args.models else None
+    pool = WorkerPool(args.workers, args.broker, models).start()
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(pool.stats()))
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()